@@ -1,7 +1,9 @@
 #!/bin/sh
 
-# Executa as migrações do banco de dados
-poetry run alembic upgrade head
+# Executa as migrações do banco de dados; só uma réplica migra por vez e,
+# com o banco já em dia, o passo termina sem carregar o Alembic
+python -m fast_zero_madr.migrate
 
-# Inicia a aplicação
-poetry run uvicorn --host 0.0.0.0 --port 8000 fast_zero_madr.app:app
\ No newline at end of file
+# Inicia a aplicação: um worker por CPU (SERVER_WORKERS), com fork a partir
+# de um processo que já importou o app
+exec python -m fast_zero_madr.serve --host 0.0.0.0 --port 8000
\ No newline at end of file
@@ -1,10 +1,70 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager, suppress
+from http import HTTPStatus
 
+from fastapi import FastAPI, Request
+
+from fast_zero_madr.database import dispose_engines, get_session_scope, replica
+from fast_zero_madr.metrics import MetricsMiddleware, metrics
 from fast_zero_madr.routes import auth, livro, romancista, users
+from fast_zero_madr.routes import metrics as metrics_route
+from fast_zero_madr.settings import Settings
+from fast_zero_madr.warmup import warm_up
+
+settings = Settings()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Respeita os overrides de dependência, como os dos testes.
+    session_scope = app.dependency_overrides.get(
+        get_session_scope, get_session_scope
+    )()
+    await warm_up(
+        app,
+        session_scope,
+        replica.direct_session if replica is not None else None,
+    )
+
+    # Só sob serve.py: os outros workers leem o snapshot deste.
+    flusher = None
+    if metrics.directory is not None:
+        flusher = asyncio.create_task(
+            metrics.flush_periodically(settings.METRICS_FLUSH_INTERVAL)
+        )
+
+    yield
+
+    if flusher is not None:
+        flusher.cancel()
+        with suppress(asyncio.CancelledError):
+            await flusher
+        metrics.write_snapshot()
+    await dispose_engines()
+
+
+app = FastAPI(lifespan=lifespan)
+
+SAFE_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+
+
+async def track_replica_writes(request: Request, call_next):
+    response = await call_next(request)
+    if (
+        request.method not in SAFE_METHODS
+        and response.status_code < HTTPStatus.BAD_REQUEST
+    ):
+        replica.record_write(request.headers.get('authorization'))
+    return response
+
+
+if replica is not None:  # pragma: no cover
+    app.middleware('http')(track_replica_writes)
 
-app = FastAPI()
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(auth.router)
 app.include_router(livro.router)
 app.include_router(users.router)
 app.include_router(romancista.router)
+app.include_router(metrics_route.router)
@@ -0,0 +1,152 @@
+import mmap
+import zlib
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic, monotonic_ns
+from typing import Protocol
+
+from fast_zero_madr.settings import Settings
+
+settings = Settings()
+
+GENERATION_SLOTS = 64
+
+
+class CacheBackend(Protocol):
+    def get(self, key, default=None): ...
+
+    def set(self, key, value, ttl: float | None = None): ...
+
+    def generation(self, namespace: str) -> int: ...
+
+    def bump(self, namespace: str) -> int: ...
+
+
+class SharedStamps:
+    """Carimbos de tempo numa memória compartilhada entre os workers.
+
+    O mmap anônimo é criado na importação, antes do fork de serve.py, e
+    os workers o herdam: o que um deles grava os outros leem em seguida.
+    Cada chave cai num slot por hash; uma colisão só faz o slot mudar sem
+    necessidade, o que custa um cache miss ou uma leitura a mais no
+    primário, nunca um dado velho.
+    """
+
+    def __init__(self, slots: int):
+        self.slots = slots
+        self._map = mmap.mmap(-1, slots * 8)
+        self._stamps = memoryview(self._map).cast('q')
+
+    def _slot(self, key: str | bytes) -> int:
+        if isinstance(key, str):
+            key = key.encode()
+        return zlib.crc32(key) % self.slots
+
+    def get(self, key: str | bytes) -> int:
+        return self._stamps[self._slot(key)]
+
+    def touch(self, key: str | bytes) -> int:
+        # O relógio monotônico é do sistema, comum a todos os processos;
+        # o +1 garante um valor novo mesmo no mesmo nanossegundo.
+        slot = self._slot(key)
+        stamp = max(monotonic_ns(), self._stamps[slot] + 1)
+        self._stamps[slot] = stamp
+        return stamp
+
+
+class TTLCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._generations = SharedStamps(GENERATION_SLOTS)
+        self._lock = Lock()
+
+    def get(self, key, default=None):
+        now = monotonic()
+
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] <= now:
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key, value, ttl: float | None = None):
+        expires = monotonic() + (self.ttl if ttl is None else ttl)
+
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            item = self._data.pop(key, None)
+        return item and item[1]
+
+    # As gerações ficam fora do LRU (despejá-las faria uma entrada antiga
+    # voltar a valer) e são compartilhadas: uma escrita num worker
+    # invalida o cache de todos.
+    def generation(self, namespace: str) -> int:
+        return self._generations.get(namespace)
+
+    def bump(self, namespace: str) -> int:
+        return self._generations.touch(namespace)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'size': len(self._data),
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+class QueryCache:
+    """Cache de resultados de consultas invalidado por geração de tabela.
+
+    A chave inclui a geração atual de cada tabela lida; uma escrita só
+    incrementa a geração da tabela, e as entradas antigas deixam de ser
+    encontradas até saírem do LRU.
+    """
+
+    def __init__(self, backend: CacheBackend):
+        self.backend = backend
+
+    def key(self, tables: tuple[str, ...], params: tuple) -> tuple:
+        generations = tuple(self.backend.generation(table) for table in tables)
+        return tables, generations, params
+
+    @staticmethod
+    def generations(key: tuple) -> tuple:
+        return key[1]
+
+    def get(self, key):
+        return self.backend.get(key)
+
+    def set(self, key, value):
+        self.backend.set(key, value)
+
+    def invalidate(self, *tables: str):
+        for table in tables:
+            self.backend.bump(table)
+
+
+query_cache = QueryCache(
+    TTLCache(settings.QUERY_CACHE_SIZE, settings.QUERY_CACHE_TTL)
+)
@@ -1,11 +1,394 @@
-from sqlalchemy import create_engine
+from contextlib import asynccontextmanager
+from functools import partial
+from hashlib import sha256
+from time import monotonic, monotonic_ns
+
+from fastapi import Depends, Request
+from fastapi.concurrency import run_in_threadpool
+from psycopg.errors import UniqueViolation
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import Session
 
+from fast_zero_madr.cache import SharedStamps
+from fast_zero_madr.metrics import metrics, pool_samples, track_queries
+from fast_zero_madr.pool_stats import (
+    PoolStats,
+    TimedAsyncAdaptedQueuePool,
+    TimedQueuePool,
+)
 from fast_zero_madr.settings import Settings
 
-engine = create_engine(Settings().DATABASE_URL)
+settings = Settings()
+
+pool_options = {
+    'pool_size': settings.DATABASE_POOL_SIZE,
+    'max_overflow': settings.DATABASE_MAX_OVERFLOW,
+    'pool_recycle': settings.DATABASE_POOL_RECYCLE,
+    'pool_pre_ping': settings.DATABASE_POOL_PRE_PING,
+    'pool_timeout': settings.DATABASE_POOL_TIMEOUT,
+}
+
+engine = create_engine(
+    settings.DATABASE_URL, poolclass=TimedQueuePool, **pool_options
+)
+async_engine = create_async_engine(
+    settings.DATABASE_URL,
+    poolclass=TimedAsyncAdaptedQueuePool,
+    **pool_options,
+)
+
+pool_stats = {'sync': PoolStats(), 'async': PoolStats()}
+pool_stats['sync'].attach(engine)
+pool_stats['async'].attach(async_engine.sync_engine)
+
+
+def is_unique_violation(exc: IntegrityError) -> bool:
+    return isinstance(exc.orig, UniqueViolation)
+
+
+class ThreadpoolResult:
+    def __init__(self, result):
+        self.sync_result = result
+
+    async def partitions(self, size: int | None = None):
+        partitions = self.sync_result.partitions(size)
+        while partition := await run_in_threadpool(next, partitions, None):
+            yield partition
+
+
+class ThreadpoolSession:
+    """Mesma interface do AsyncSession sobre um Session síncrono.
+
+    Cada ida ao banco roda no threadpool, como nos antigos handlers
+    síncronos, para comparar os dois caminhos com DATABASE_ASYNC.
+    """
+
+    def __init__(self, session: Session):
+        self.sync_session = session
+
+    @property
+    def info(self) -> dict:
+        return self.sync_session.info
+
+    def add(self, instance):
+        self.sync_session.add(instance)
+
+    def add_all(self, instances):
+        self.sync_session.add_all(instances)
+
+    async def execute(self, *args, **kwargs):
+        return await run_in_threadpool(
+            self.sync_session.execute, *args, **kwargs
+        )
+
+    async def scalar(self, *args, **kwargs):
+        return await run_in_threadpool(
+            self.sync_session.scalar, *args, **kwargs
+        )
+
+    async def scalars(self, *args, **kwargs):
+        return await run_in_threadpool(
+            self.sync_session.scalars, *args, **kwargs
+        )
+
+    async def stream(self, statement, *args, **kwargs):
+        result = await run_in_threadpool(
+            self.sync_session.execute,
+            statement.execution_options(stream_results=True),
+            *args,
+            **kwargs,
+        )
+        return ThreadpoolResult(result)
+
+    async def get(self, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.get, *args, **kwargs)
+
+    async def merge(self, instance, *args, **kwargs):
+        return await run_in_threadpool(
+            self.sync_session.merge, instance, *args, **kwargs
+        )
 
+    async def delete(self, instance):
+        await run_in_threadpool(self.sync_session.delete, instance)
 
-def get_session():  # pragma: no cover
-    with Session(engine) as session:
+    async def refresh(self, instance, *args, **kwargs):
+        await run_in_threadpool(
+            self.sync_session.refresh, instance, *args, **kwargs
+        )
+
+    async def flush(self, *args, **kwargs):
+        await run_in_threadpool(self.sync_session.flush, *args, **kwargs)
+
+    async def commit(self):
+        await run_in_threadpool(self.sync_session.commit)
+
+    async def rollback(self):
+        await run_in_threadpool(self.sync_session.rollback)
+
+    async def close(self):
+        await run_in_threadpool(self.sync_session.close)
+
+
+def open_session(async_bind, sync_bind):
+    if settings.DATABASE_ASYNC:
+        return AsyncSession(async_bind, expire_on_commit=False)
+    return ThreadpoolSession(Session(sync_bind, expire_on_commit=False))
+
+
+@asynccontextmanager
+async def session_scope():
+    session = open_session(async_engine, engine)
+    try:
         yield session
+    finally:
+        await session.close()
+
+
+# Num primário as funções de WAL retornam NULL e o atraso sai 0; numa
+# réplica em dia (receive = replay) também, mesmo sem escritas recentes.
+REPLICA_LAG = text(
+    'SELECT CASE WHEN pg_last_wal_receive_lsn() '
+    'IS DISTINCT FROM pg_last_wal_replay_lsn() '
+    'THEN extract(epoch FROM now() - pg_last_xact_replay_timestamp()) '
+    'ELSE 0 END'
+)
+
+
+CACHE_SCOPE = 'cache_scope'
+
+
+def read_cache_scope(session) -> str | None:
+    """Em que cache uma leitura pode ser guardada e buscada.
+
+    Leituras da réplica, talvez atrasadas, ficam separadas das do
+    primário; None (quem acabou de escrever) não usa cache algum.
+    """
+    return session.info.get(CACHE_SCOPE, 'primary')
+
+
+def may_cache(scope: str | None, stamps) -> bool:
+    """Se uma leitura feita em `scope` pode ir para o cache.
+
+    `stamps` são as gerações/versões lidas antes da consulta. Uma réplica
+    aprovada pelo health check pode estar até DATABASE_READ_MAX_LAG
+    atrasada (mais o intervalo entre checagens), então a leitura dela só
+    é guardada quando as escritas carimbadas são mais antigas que isso;
+    antes, ela pode ser anterior a elas e ficaria no cache pelo TTL todo.
+    """
+    if scope == 'replica':
+        settle = (
+            settings.DATABASE_READ_MAX_LAG
+            + settings.DATABASE_READ_CHECK_INTERVAL
+        ) * 1e9
+        now = monotonic_ns()
+        return all(now - stamp >= settle for stamp in stamps)
+    return scope is not None
+
+
+class ReplicaRouter:
+    """Escolhe, a cada leitura, entre a réplica e a sessão do primário."""
+
+    def __init__(self, async_bind, sync_bind):
+        self.async_bind = async_bind
+        self.sync_bind = sync_bind
+        # Compartilhado entre os workers: a leitura seguinte do cliente
+        # pode cair em outro processo.
+        self.writers = SharedStamps(settings.DATABASE_READ_YOUR_WRITES_SIZE)
+        self.down_until = 0.0
+        self.checked_at = None
+        self.lag_ok = True
+
+    @staticmethod
+    def _client_key(client: str) -> bytes:
+        return sha256(client.encode()).digest()
+
+    def record_write(self, client: str | None):
+        if client:
+            self.writers.touch(self._client_key(client))
+
+    def mark_down(self):
+        self.down_until = monotonic() + settings.DATABASE_READ_RETRY_AFTER
+        self.checked_at = None
+
+    def recently_wrote(self, client: str | None) -> bool:
+        if not client:
+            return False
+        elapsed = monotonic_ns() - self.writers.get(self._client_key(client))
+        return elapsed < settings.DATABASE_READ_YOUR_WRITES * 1e9
+
+    def usable(self, client: str | None) -> bool:
+        return monotonic() >= self.down_until and not self.recently_wrote(
+            client
+        )
+
+    async def healthy(self, session) -> bool:
+        now = monotonic()
+        if (
+            self.checked_at is not None
+            and now - self.checked_at < settings.DATABASE_READ_CHECK_INTERVAL
+        ):
+            return self.lag_ok
+
+        try:
+            lag = await session.scalar(REPLICA_LAG)
+        except OperationalError:
+            self.mark_down()
+            return False
+
+        self.checked_at = now
+        self.lag_ok = (lag or 0) <= settings.DATABASE_READ_MAX_LAG
+        return self.lag_ok
+
+    @asynccontextmanager
+    async def direct_session(self):
+        # Sem roteamento nem fallback: para o aquecimento da réplica.
+        session = open_session(self.async_bind, self.sync_bind)
+        try:
+            yield session
+        finally:
+            await session.close()
+
+    @asynccontextmanager
+    async def session_scope(self, client: str | None, fallback):
+        if self.recently_wrote(client):
+            # O cache pode guardar uma página anterior à escrita.
+            fallback.info[CACHE_SCOPE] = None
+            yield fallback
+            return
+
+        if not self.usable(client):
+            yield fallback
+            return
+
+        session = open_session(self.async_bind, self.sync_bind)
+        session.info[CACHE_SCOPE] = 'replica'
+        try:
+            if not await self.healthy(session):
+                yield fallback
+                return
+
+            yield ReplicaSession(self, session, fallback)
+        finally:
+            await session.close()
+
+
+class ReplicaSession:
+    """Leituras na réplica que, se ela cair no meio da requisição, são
+    refeitas na sessão do primário.
+
+    O resultado do health check fica em cache por alguns instantes, então
+    a réplica pode parar depois de aprovada; sem isso a requisição que
+    encontrasse a falha sairia com 500.
+    """
+
+    def __init__(self, router: ReplicaRouter, session, fallback):
+        self.router = router
+        self.session = session
+        self.fallback = fallback
+        self.failed = False
+
+    @property
+    def info(self) -> dict:
+        return self.session.info
+
+    async def _read(self, method: str, *args, **kwargs):
+        if not self.failed:
+            try:
+                return await getattr(self.session, method)(*args, **kwargs)
+            except OperationalError:
+                self.router.mark_down()
+                self.failed = True
+        return await getattr(self.fallback, method)(*args, **kwargs)
+
+    async def execute(self, *args, **kwargs):
+        return await self._read('execute', *args, **kwargs)
+
+    async def scalar(self, *args, **kwargs):
+        return await self._read('scalar', *args, **kwargs)
+
+    async def scalars(self, *args, **kwargs):
+        return await self._read('scalars', *args, **kwargs)
+
+    async def get(self, *args, **kwargs):
+        return await self._read('get', *args, **kwargs)
+
+
+replica = None
+if settings.DATABASE_READ_URL:
+    read_options = {
+        **pool_options,
+        'connect_args': {
+            'connect_timeout': settings.DATABASE_READ_CONNECT_TIMEOUT
+        },
+    }
+    replica = ReplicaRouter(
+        create_async_engine(
+            settings.DATABASE_READ_URL,
+            poolclass=TimedAsyncAdaptedQueuePool,
+            **read_options,
+        ),
+        create_engine(
+            settings.DATABASE_READ_URL,
+            poolclass=TimedQueuePool,
+            **read_options,
+        ),
+    )
+    pool_stats['read_sync'] = PoolStats()
+    pool_stats['read_sync'].attach(replica.sync_bind)
+    pool_stats['read_async'] = PoolStats()
+    pool_stats['read_async'].attach(replica.async_bind.sync_engine)
+
+
+def engines():
+    yield engine
+    yield async_engine.sync_engine
+    if replica is not None:
+        yield replica.sync_bind
+        yield replica.async_bind.sync_engine
+
+
+for bind in engines():
+    track_queries(bind)
+metrics.add_collector(partial(pool_samples, pool_stats))
+
+
+def reset_pools_after_fork():
+    # Conexões herdadas do processo pai não podem ser usadas no filho;
+    # close=False só as descarta, sem fechar os sockets que são do pai.
+    for bind in engines():
+        bind.dispose(close=False)
+
+
+async def dispose_engines():
+    await async_engine.dispose()
+    engine.dispose()
+    if replica is not None:
+        await replica.async_bind.dispose()
+        replica.sync_bind.dispose()
+
+
+async def get_session():  # pragma: no cover
+    async with session_scope() as session:
+        yield session
+
+
+async def get_read_session(
+    request: Request, session: AsyncSession = Depends(get_session)
+):
+    # Sem réplica, a leitura usa a mesma sessão (e conexão) do primário.
+    if replica is None:
+        yield session
+        return
+
+    async with replica.session_scope(
+        request.headers.get('authorization'), session
+    ) as read_session:
+        yield read_session
+
+
+def get_session_scope():  # pragma: no cover
+    # Para respostas em streaming: a sessão de get_session é fechada antes
+    # de o corpo ser enviado, então a rota abre a sua própria.
+    return session_scope
@@ -0,0 +1,54 @@
+import hashlib
+from dataclasses import dataclass
+from http import HTTPStatus
+from typing import Annotated
+
+from fastapi import Depends, Request, Response
+
+
+def strong_etag(*parts) -> str:
+    return '"' + '.'.join(str(part) for part in parts) + '"'
+
+
+def weak_etag(*parts) -> str:
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=16)
+    return f'W/"{digest.hexdigest()}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+
+    if if_none_match.strip() == '*':
+        return True
+
+    # If-None-Match usa a comparação fraca: W/"x" casa com "x".
+    opaque = etag.removeprefix('W/')
+    return any(
+        tag.strip().removeprefix('W/') == opaque
+        for tag in if_none_match.split(',')
+    )
+
+
+@dataclass
+class ConditionalGet:
+    request: Request
+    response: Response
+
+    def not_modified(self, etag: str) -> Response | None:
+        self.response.headers['ETag'] = etag
+
+        if not etag_matches(self.request.headers.get('if-none-match'), etag):
+            return None
+
+        # O 304 sai sem corpo, então a serialização nem chega a acontecer.
+        return Response(
+            status_code=HTTPStatus.NOT_MODIFIED, headers={'ETag': etag}
+        )
+
+    def list_etag(self, versions) -> str:
+        # A query string carrega filtro, cursor e limite da página.
+        return weak_etag(self.request.url.query, versions)
+
+
+T_ConditionalGet = Annotated[ConditionalGet, Depends()]
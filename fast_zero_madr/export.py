@@ -0,0 +1,42 @@
+import csv
+import json
+import zlib
+from io import StringIO
+
+MEDIA_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def csv_line(values) -> bytes:
+    buffer = StringIO()
+    csv.writer(buffer).writerow(values)
+    return buffer.getvalue().encode()
+
+
+async def encode_rows(partitions, formato: str, fields: list[str]):
+    if formato == 'csv':
+        yield csv_line(fields)
+
+    async for partition in partitions:
+        if formato == 'ndjson':
+            yield ''.join(
+                json.dumps(row._asdict(), ensure_ascii=False) + '\n'
+                for row in partition
+            ).encode()
+            continue
+
+        buffer = StringIO()
+        csv.writer(buffer).writerows(partition)
+        yield buffer.getvalue().encode()
+
+
+async def gzip_stream(chunks):
+    compressor = zlib.compressobj(wbits=31)
+
+    async for chunk in chunks:
+        if data := compressor.compress(chunk):
+            yield data
+
+    yield compressor.flush()
@@ -0,0 +1,197 @@
+"""Carga inicial do acervo via COPY.
+
+Uso: python -m fast_zero_madr.importer --romancistas r.csv --livros l.ndjson
+
+Romancistas têm a coluna `nome`; livros têm `titulo`, `ano` e `romancista`
+(o nome do autor). Arquivos .csv precisam de cabeçalho; os demais são lidos
+como NDJSON, um objeto por linha.
+"""
+
+import argparse
+import csv
+import json
+from dataclasses import dataclass
+from pathlib import Path
+from time import perf_counter
+
+from fast_zero_madr.database import engine
+
+ROMANCISTA_FIELDS = ('nome',)
+LIVRO_FIELDS = ('titulo', 'ano', 'romancista')
+
+
+@dataclass
+class ImportReport:
+    table: str
+    read: int
+    inserted: int
+    rejected: dict[str, int]
+    seconds: float
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.read / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        rejected = ', '.join(f'{n} {r}' for r, n in self.rejected.items() if n)
+        return (
+            f'{self.table}: {self.read} lidas, {self.inserted} inseridas, '
+            f'{sum(self.rejected.values())} rejeitadas'
+            f'{f" ({rejected})" if rejected else ""} '
+            f'- {self.rows_per_second:.0f} linhas/s'
+        )
+
+
+def read_rows(path: Path, fields: tuple[str, ...]):
+    with path.open(newline='', encoding='utf-8') as file:
+        if path.suffix == '.csv':
+            records = csv.DictReader(file)
+        else:
+            records = (json.loads(line) for line in file if line.strip())
+
+        for record in records:
+            yield tuple(
+                None if record.get(field) is None else str(record[field])
+                for field in fields
+            )
+
+
+def copy_rows(cursor, table: str, fields: tuple[str, ...], rows) -> int:
+    count = 0
+    columns = ', '.join(('line', *fields))
+
+    with cursor.copy(f'COPY {table} ({columns}) FROM STDIN') as copy:
+        for count, row in enumerate(rows, start=1):
+            copy.write_row((count, *row))
+
+    return count
+
+
+def import_romancistas(connection, path: Path) -> ImportReport:
+    start = perf_counter()
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'CREATE TEMP TABLE staging_romancistas '
+            '(line int, nome text) ON COMMIT DROP'
+        )
+        read = copy_rows(
+            cursor,
+            'staging_romancistas',
+            ROMANCISTA_FIELDS,
+            read_rows(path, ROMANCISTA_FIELDS),
+        )
+
+        cursor.execute(
+            'SELECT count(*) FROM staging_romancistas '
+            "WHERE coalesce(trim(nome), '') = ''"
+        )
+        (empty,) = cursor.fetchone()
+
+        cursor.execute(
+            'INSERT INTO romancistas (nome) '
+            'SELECT trim(nome) FROM staging_romancistas '
+            "WHERE coalesce(trim(nome), '') <> '' "
+            'GROUP BY trim(nome) ORDER BY min(line) '
+            'ON CONFLICT (nome) DO NOTHING'
+        )
+        inserted = cursor.rowcount
+
+    connection.commit()
+
+    return ImportReport(
+        table='romancistas',
+        read=read,
+        inserted=inserted,
+        rejected={
+            'sem nome': empty,
+            'duplicadas': read - empty - inserted,
+        },
+        seconds=perf_counter() - start,
+    )
+
+
+def import_livros(connection, path: Path) -> ImportReport:
+    start = perf_counter()
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'CREATE TEMP TABLE staging_livros '
+            '(line int, titulo text, ano text, romancista text) '
+            'ON COMMIT DROP'
+        )
+        read = copy_rows(
+            cursor,
+            'staging_livros',
+            LIVRO_FIELDS,
+            read_rows(path, LIVRO_FIELDS),
+        )
+
+        # Resolve os autores pelo nome numa única passada e marca o motivo
+        # de rejeição de cada linha inválida.
+        cursor.execute(
+            'CREATE TEMP TABLE resolved_livros ON COMMIT DROP AS '
+            'SELECT s.line, trim(s.titulo) AS titulo, trim(s.ano) AS ano, '
+            'r.id AS id_romancista, CASE '
+            "WHEN coalesce(trim(s.titulo), '') = '' THEN 'sem título' "
+            "WHEN coalesce(trim(s.ano), '') !~ '^-?[0-9]{1,9}$' "
+            "THEN 'ano inválido' "
+            "WHEN r.id IS NULL THEN 'romancista desconhecido' "
+            'END AS rejected '
+            'FROM staging_livros s '
+            'LEFT JOIN romancistas r ON r.nome = trim(s.romancista)'
+        )
+        cursor.execute(
+            'SELECT rejected, count(*) FROM resolved_livros '
+            'WHERE rejected IS NOT NULL GROUP BY rejected'
+        )
+        rejected = dict(cursor.fetchall())
+
+        cursor.execute(
+            'INSERT INTO livros (titulo, ano, id_romancista) '
+            'SELECT titulo, ano::int, id_romancista FROM ('
+            'SELECT DISTINCT ON (titulo) * FROM resolved_livros '
+            'WHERE rejected IS NULL ORDER BY titulo, line'
+            ') AS first_seen ORDER BY line '
+            'ON CONFLICT (titulo) DO NOTHING'
+        )
+        inserted = cursor.rowcount
+
+    connection.commit()
+
+    return ImportReport(
+        table='livros',
+        read=read,
+        inserted=inserted,
+        rejected={
+            **rejected,
+            'duplicadas': read - sum(rejected.values()) - inserted,
+        },
+        seconds=perf_counter() - start,
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m fast_zero_madr.importer',
+        description='Carga do acervo via COPY.',
+    )
+    parser.add_argument('--romancistas', type=Path)
+    parser.add_argument('--livros', type=Path)
+    args = parser.parse_args(argv)
+
+    if not (args.romancistas or args.livros):
+        parser.error('informe --romancistas e/ou --livros')
+
+    with engine.connect() as connection:
+        driver_connection = connection.connection.driver_connection
+
+        # Romancistas primeiro, para que os livros encontrem seus autores.
+        if args.romancistas:
+            print(import_romancistas(driver_connection, args.romancistas))
+        if args.livros:
+            print(import_livros(driver_connection, args.livros))
+
+
+if __name__ == '__main__':
+    main()
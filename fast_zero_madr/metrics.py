@@ -0,0 +1,422 @@
+"""Métricas no formato texto do Prometheus.
+
+Cada processo acumula contadores, gauges e histogramas em memória: uma
+requisição custa um lock e algumas somas. Com vários workers (serve.py),
+cada um grava periodicamente um snapshot em `directory` e o /metrics soma
+os de todos. O processo principal incorpora ao archive.json os contadores
+e histogramas dos workers que terminam, para que os totais não voltem
+atrás quando um worker é reciclado.
+"""
+
+import asyncio
+import fcntl
+import json
+import logging
+import os
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from threading import Lock
+from time import perf_counter
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)  # fmt: skip
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+HASH_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+# nome: (tipo, descrição, buckets dos histogramas)
+METRICS = {
+    'http_requests_total': ('counter', 'Requisições atendidas.', None),
+    'http_requests_in_flight': (
+        'gauge',
+        'Requisições em andamento.',
+        None,
+    ),
+    'http_request_duration_seconds': (
+        'histogram',
+        'Latência das requisições por rota.',
+        LATENCY_BUCKETS,
+    ),
+    'http_response_size_bytes': (
+        'histogram',
+        'Tamanho do corpo das respostas por rota.',
+        SIZE_BUCKETS,
+    ),
+    'http_request_db_queries_total': (
+        'counter',
+        'Consultas ao banco feitas pelas requisições de cada rota.',
+        None,
+    ),
+    'http_request_db_seconds_total': (
+        'counter',
+        'Tempo gasto em consultas ao banco pelas requisições de cada rota.',
+        None,
+    ),
+    'db_pool_size': ('gauge', 'Tamanho configurado do pool.', None),
+    'db_pool_checked_out': ('gauge', 'Conexões em uso.', None),
+    'db_pool_checked_in': ('gauge', 'Conexões livres no pool.', None),
+    'db_pool_overflow': ('gauge', 'Conexões além do tamanho do pool.', None),
+    'db_pool_checkouts_total': ('counter', 'Conexões entregues.', None),
+    'db_pool_checkout_wait_seconds_total': (
+        'counter',
+        'Tempo total de espera por uma conexão.',
+        None,
+    ),
+    'db_pool_checkout_wait_max_seconds': (
+        'gauge',
+        'Maior espera por uma conexão.',
+        None,
+    ),
+    'db_pool_connects_total': ('counter', 'Conexões abertas.', None),
+    'db_pool_closes_total': ('counter', 'Conexões fechadas.', None),
+    'db_pool_invalidations_total': (
+        'counter',
+        'Conexões invalidadas.',
+        None,
+    ),
+    'password_hash_duration_seconds': (
+        'histogram',
+        'Duração das operações de Argon2.',
+        HASH_BUCKETS,
+    ),
+    'password_hash_queued': (
+        'gauge',
+        'Operações de Argon2 esperando um worker.',
+        None,
+    ),
+    'password_hash_running': (
+        'gauge',
+        'Operações de Argon2 em execução.',
+        None,
+    ),
+}
+
+# Entre processos, gauges são somados; estes ficam com o maior valor.
+MAX_GAUGES = {'db_pool_checkout_wait_max_seconds'}
+
+POOL_GAUGES = {
+    'size': 'db_pool_size',
+    'checked_out': 'db_pool_checked_out',
+    'checked_in': 'db_pool_checked_in',
+    'overflow': 'db_pool_overflow',
+    'checkout_wait_max': 'db_pool_checkout_wait_max_seconds',
+}
+POOL_COUNTERS = {
+    'checkouts': 'db_pool_checkouts_total',
+    'checkout_wait_total': 'db_pool_checkout_wait_seconds_total',
+    'connects': 'db_pool_connects_total',
+    'closes': 'db_pool_closes_total',
+    'invalidations': 'db_pool_invalidations_total',
+}
+
+ARCHIVE = 'archive.json'
+
+logger = logging.getLogger(__name__)
+
+# [consultas, segundos] da requisição em andamento; as threads do
+# threadpool herdam o contexto, então consultas síncronas também contam.
+current_queries: ContextVar[list | None] = ContextVar(
+    'current_queries', default=None
+)
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = Lock()
+        # O flusher e /metrics (no threadpool) gravam o mesmo .tmp.
+        self._write_lock = Lock()
+        self.values = {}
+        self.in_flight = 0
+        self.collectors = []
+        self.directory: Path | None = None
+
+    def reset(self):
+        with self._lock:
+            self.values.clear()
+
+    def add_collector(self, collector):
+        """`collector()` devolve amostras (tipo, nome, labels, valor)."""
+        self.collectors.append(collector)
+
+    def record_request(self, labels, status, elapsed, size, queries):
+        with self._lock:
+            self._inc(
+                'http_requests_total', (*labels, ('status', str(status)))
+            )
+            self._observe('http_request_duration_seconds', labels, elapsed)
+            self._observe('http_response_size_bytes', labels, size)
+            if queries[0]:
+                self._inc('http_request_db_queries_total', labels, queries[0])
+                self._inc('http_request_db_seconds_total', labels, queries[1])
+
+    def observe(self, name: str, labels: tuple, value: float):
+        with self._lock:
+            self._observe(name, labels, value)
+
+    def _inc(self, name, labels, value=1):
+        key = ('counter', name, labels)
+        self.values[key] = self.values.get(key, 0) + value
+
+    def _observe(self, name, labels, value):
+        key = ('histogram', name, labels)
+        counts = self.values.get(key)
+        if counts is None:
+            # Uma posição por bucket, mais +Inf e a soma.
+            buckets = METRICS[name][2]
+            counts = self.values[key] = [0] * (len(buckets) + 2)
+        counts[bisect_left(METRICS[name][2], value)] += 1
+        counts[-1] += value
+
+    def snapshot(self) -> dict:
+        samples = {('gauge', 'http_requests_in_flight', ()): self.in_flight}
+        for collector in self.collectors:
+            for kind, name, labels, value in collector():
+                samples[kind, name, labels] = value
+        with self._lock:
+            for key, value in self.values.items():
+                samples[key] = (
+                    list(value) if isinstance(value, list) else value
+                )
+        return samples
+
+    # Vários processos
+
+    def enable_multiprocess(self, directory):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for path in self.directory.glob('*.json'):
+            path.unlink()
+
+    def write_snapshot(self, pid: int | None = None):
+        path = self.directory / f'{pid or os.getpid()}.json'
+        tmp = path.with_suffix('.tmp')
+        with self._write_lock:
+            tmp.write_text(_dumps(self.snapshot()), encoding='utf-8')
+            os.replace(tmp, path)
+
+    def retire(self, pid: int):
+        """Incorpora ao arquivo os totais de um worker que terminou."""
+        path = self.directory / f'{pid}.json'
+        with self._directory_lock(fcntl.LOCK_EX):
+            if not path.exists():
+                return
+            archive_path = self.directory / ARCHIVE
+            archive = _load(archive_path)
+            totals = {
+                key: value
+                for key, value in _load(path).items()
+                if key[0] != 'gauge'
+            }
+            _merge(archive, totals)
+            tmp = archive_path.with_suffix('.tmp')
+            tmp.write_text(_dumps(archive), encoding='utf-8')
+            os.replace(tmp, archive_path)
+            path.unlink()
+
+    def aggregate(self) -> dict:
+        if self.directory is None:
+            return self.snapshot()
+
+        self.write_snapshot()
+        samples = {}
+        with self._directory_lock(fcntl.LOCK_SH):
+            for path in self.directory.glob('*.json'):
+                _merge(samples, _load(path))
+        return samples
+
+    @contextmanager
+    def _directory_lock(self, operation):
+        with open(self.directory / 'lock', 'a', encoding='utf-8') as lock_file:
+            fcntl.flock(lock_file, operation)
+            yield
+
+    async def flush_periodically(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            # Disco cheio ou diretório removido não pode matar o flusher.
+            try:
+                self.write_snapshot()
+            except OSError:
+                logger.warning('Snapshot de métricas falhou', exc_info=True)
+
+    def render(self) -> str:
+        return render(self.aggregate())
+
+
+def _dumps(samples: dict) -> str:
+    return json.dumps([
+        [kind, name, labels, value]
+        for (kind, name, labels), value in samples.items()
+    ])
+
+
+def _load(path: Path) -> dict:
+    try:
+        rows = json.loads(path.read_text(encoding='utf-8'))
+    except FileNotFoundError:
+        return {}
+    return {
+        (kind, name, tuple(map(tuple, labels))): value
+        for kind, name, labels, value in rows
+    }
+
+
+def _merge(into: dict, samples: dict):
+    for key, value in samples.items():
+        current = into.get(key)
+        if current is None:
+            into[key] = list(value) if isinstance(value, list) else value
+        elif isinstance(value, list):
+            into[key] = [a + b for a, b in zip(current, value)]
+        elif key[1] in MAX_GAUGES:
+            into[key] = max(current, value)
+        else:
+            into[key] = current + value
+
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(
+            name,
+            str(value)
+            .replace('\\', r'\\')
+            .replace('\n', r'\n')
+            .replace('"', r'\"'),
+        )
+        for name, value in labels
+    )
+    return f'{{{pairs}}}'
+
+
+def _format_value(value) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+def render(samples: dict) -> str:
+    by_name = {}
+    for (kind, name, labels), value in samples.items():
+        by_name.setdefault(name, []).append((labels, value))
+
+    lines = []
+    for name in sorted(by_name):
+        kind, description, buckets = METRICS[name]
+        lines.extend((f'# HELP {name} {description}', f'# TYPE {name} {kind}'))
+        for labels, value in sorted(by_name[name]):
+            if kind != 'histogram':
+                lines.append(
+                    f'{name}{_format_labels(labels)} {_format_value(value)}'
+                )
+                continue
+
+            cumulative = 0
+            for bound, count in zip((*buckets, float('inf')), value):
+                cumulative += count
+                le = (*labels, ('le', _format_value(bound)))
+                lines.append(f'{name}_bucket{_format_labels(le)} {cumulative}')
+            lines.extend((
+                f'{name}_sum{_format_labels(labels)} '
+                f'{_format_value(value[-1])}',
+                f'{name}_count{_format_labels(labels)} {cumulative}',
+            ))
+    return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+class MetricsMiddleware:
+    """Middleware ASGI que mede cada requisição HTTP.
+
+    A rota é o template (/livro/{livro_id}/), lido do escopo depois que o
+    roteador o preenche; requisições sem rota ficam como 'unmatched'.
+    """
+
+    def __init__(self, app, registry: Metrics = metrics):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            elif message['type'] == 'http.response.body':
+                size += len(message.get('body', b''))
+            await send(message)
+
+        queries = [0, 0.0]
+        token = current_queries.set(queries)
+        self.registry.in_flight += 1
+        start = perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = perf_counter() - start
+            self.registry.in_flight -= 1
+            current_queries.reset(token)
+            route = scope.get('route')
+            self.registry.record_request(
+                (
+                    ('method', scope['method']),
+                    ('route', route.path if route else 'unmatched'),
+                ),
+                status,
+                elapsed,
+                size,
+                queries,
+            )
+
+
+def track_queries(engine: Engine):
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+def untrack_queries(engine: Engine):
+    event.remove(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.remove(engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+def _before_cursor_execute(conn, cursor, statement, *args):
+    conn.info['query_start'] = perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, *args):
+    queries = current_queries.get()
+    if queries is not None:
+        queries[0] += 1
+        queries[1] += perf_counter() - conn.info['query_start']
+
+
+def pool_samples(pool_stats: dict):
+    for engine_name, stats in pool_stats.items():
+        snapshot = stats.snapshot()
+        labels = (('engine', engine_name),)
+        for key, name in POOL_GAUGES.items():
+            yield 'gauge', name, labels, snapshot[key]
+        for key, name in POOL_COUNTERS.items():
+            yield 'counter', name, labels, snapshot[key]
+
+
+def hash_samples(executor):
+    stats = executor.stats()
+    yield 'gauge', 'password_hash_queued', (), stats['queued']
+    yield 'gauge', 'password_hash_running', (), stats['running']
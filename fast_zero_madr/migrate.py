@@ -0,0 +1,68 @@
+"""Migrações na subida do container.
+
+Uso: python -m fast_zero_madr.migrate
+
+Se alembic_version já está em HEAD, sai sem carregar os scripts do
+Alembic. Senão, toma um advisory lock no Postgres: só uma réplica migra, e
+as demais esperam o lock e encontram o banco já atualizado.
+"""
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool
+
+from fast_zero_madr.settings import Settings
+
+# Atualize a cada nova migração; test_migrate confere com os scripts.
+HEAD = 'b4d7e1a9c352'
+LOCK_ID = 0x4D414452  # 'MADR'
+
+
+def current_revision(connection) -> str | None:
+    if connection.scalar(text("SELECT to_regclass('alembic_version')")):
+        return connection.scalar(
+            text('SELECT version_num FROM alembic_version')
+        )
+    return None
+
+
+def alembic_upgrade():
+    # Importar o Alembic custa ~80ms; o caminho já em HEAD não paga isso.
+    from alembic import command
+    from alembic.config import Config
+
+    command.upgrade(Config('alembic.ini'), 'head')
+
+
+def migrate(engine, upgrade=alembic_upgrade) -> bool:
+    with engine.connect() as connection:
+        if current_revision(connection) == HEAD:
+            return False
+
+        connection.execute(
+            text('SELECT pg_advisory_lock(:id)'), {'id': LOCK_ID}
+        )
+        try:
+            # Outra réplica pode ter migrado enquanto esperávamos o lock.
+            if current_revision(connection) == HEAD:
+                return False
+
+            # O lock é da sessão e sobrevive ao commit, que só libera o
+            # snapshot antes de o Alembic alterar as tabelas.
+            connection.commit()
+            upgrade()
+            return True
+        finally:
+            connection.execute(
+                text('SELECT pg_advisory_unlock(:id)'), {'id': LOCK_ID}
+            )
+            connection.commit()
+
+
+def main():
+    engine = create_engine(Settings().DATABASE_URL, poolclass=NullPool)
+    migrate(engine)
+    engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,50 @@
-from sqlalchemy import ForeignKey
+from sqlalchemy import (
+    DDL,
+    Computed,
+    ForeignKey,
+    Index,
+    event,
+    func,
+    literal_column,
+)
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import Mapped, mapped_column, registry, relationship
 
 table_registry = registry()
 
+# unaccent() é STABLE e não pode ser usado num índice; o wrapper IMMUTABLE
+# fixa o dicionário e permite indexar f_unaccent(coluna).
+for statement in (
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE EXTENSION IF NOT EXISTS unaccent',
+    'CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text AS $$ '
+    "SELECT public.unaccent('public.unaccent', $1) $$ "
+    'LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT',
+):
+    event.listen(table_registry.metadata, 'before_create', DDL(statement))
+
+
+def search_vector(column: str):
+    return mapped_column(
+        TSVECTOR,
+        Computed(
+            f"to_tsvector('portuguese', f_unaccent({column}))", persisted=True
+        ),
+        init=False,
+        deferred=True,
+        repr=False,
+    )
+
+
+def version_counter():
+    # Incrementado pelo próprio UPDATE; alimenta os ETags das leituras.
+    return mapped_column(
+        init=False,
+        server_default='1',
+        onupdate=literal_column('versao') + 1,
+        repr=False,
+    )
+
 
 @table_registry.mapped_as_dataclass
 class User:
@@ -20,9 +62,15 @@ class Romancista:
 
     id: Mapped[int] = mapped_column(init=False, primary_key=True)
     nome: Mapped[str] = mapped_column(unique=True)
+    versao: Mapped[int] = version_counter()
+    busca: Mapped[str] = search_vector('nome')
 
     livros: Mapped[list['Livro']] = relationship(
-        init=False, back_populates='romancistas', cascade='all, delete-orphan'
+        init=False,
+        back_populates='romancistas',
+        cascade='all, delete-orphan',
+        passive_deletes=True,
+        order_by='Livro.id',
     )
 
 
@@ -33,8 +81,39 @@ class Livro:
     id: Mapped[int] = mapped_column(init=False, primary_key=True)
     titulo: Mapped[str] = mapped_column(unique=True)
     ano: Mapped[int]
-    id_romancista: Mapped[int] = mapped_column(ForeignKey('romancistas.id'))
+    id_romancista: Mapped[int] = mapped_column(
+        ForeignKey('romancistas.id', ondelete='CASCADE'), index=True
+    )
+    versao: Mapped[int] = version_counter()
+    busca: Mapped[str] = search_vector('titulo')
 
     romancistas: Mapped[Romancista] = relationship(
         init=False, back_populates='livros'
     )
+
+
+Index(
+    'ix_romancistas_nome_trgm',
+    func.f_unaccent(Romancista.nome).label('nome_unaccent'),
+    postgresql_using='gin',
+    postgresql_ops={'nome_unaccent': 'gin_trgm_ops'},
+)
+Index(
+    'ix_livros_titulo_trgm',
+    func.f_unaccent(Livro.titulo).label('titulo_unaccent'),
+    postgresql_using='gin',
+    postgresql_ops={'titulo_unaccent': 'gin_trgm_ops'},
+)
+Index('ix_romancistas_busca', Romancista.busca, postgresql_using='gin')
+Index('ix_livros_busca', Livro.busca, postgresql_using='gin')
+
+# Colunas das leituras de listagem: selecionadas como Row tuples, sem
+# identity map nem estado de instância por linha.
+ROMANCISTA_LIST_COLUMNS = (Romancista.nome, Romancista.id, Romancista.versao)
+LIVRO_LIST_COLUMNS = (
+    Livro.titulo,
+    Livro.ano,
+    Livro.id_romancista,
+    Livro.id,
+    Livro.versao,
+)
@@ -0,0 +1,128 @@
+import binascii
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from dataclasses import dataclass
+from http import HTTPStatus
+from typing import Annotated, Literal
+
+from fastapi import Depends, HTTPException, Query
+from sqlalchemy import ClauseElement, Executable, Select, func, text
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import InstrumentedAttribute
+
+from fast_zero_madr.settings import Settings
+
+settings = Settings()
+
+T_WithCount = Literal['exact', 'estimated'] | None
+
+
+@dataclass
+class PageParams:
+    limit: int = Query(
+        settings.PAGE_SIZE_DEFAULT, gt=0, le=settings.PAGE_SIZE_MAX
+    )
+    cursor: str | None = Query(None)
+    offset: int | None = Query(None, ge=0)
+    with_count: T_WithCount = Query(None)
+
+
+@dataclass
+class OffsetPageParams:
+    limit: int = Query(
+        settings.PAGE_SIZE_DEFAULT, gt=0, le=settings.PAGE_SIZE_MAX
+    )
+    offset: int = Query(0, ge=0)
+    with_count: T_WithCount = Query(None)
+
+
+T_Page = Annotated[PageParams, Depends()]
+T_OffsetPage = Annotated[OffsetPageParams, Depends()]
+
+
+def encode_cursor(key: InstrumentedAttribute, value) -> str:
+    data = json.dumps({key.key: value}, separators=(',', ':')).encode()
+    return urlsafe_b64encode(data).decode().rstrip('=')
+
+
+def decode_cursor(key: InstrumentedAttribute, cursor: str):
+    try:
+        data = json.loads(urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        value = data[key.key]
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        value = None
+
+    # bool é subclasse de int: {"id": true} não pode passar como id.
+    if isinstance(value, bool) or not isinstance(value, key.type.python_type):
+        raise HTTPException(
+            status_code=HTTPStatus.BAD_REQUEST,
+            detail='Cursor inválido',
+        )
+
+    return value
+
+
+async def paginate(
+    session, query: Select, key: InstrumentedAttribute, page: PageParams
+):
+    if page.cursor:
+        query = query.where(key > decode_cursor(key, page.cursor))
+
+    # Uma linha a mais indica se existe uma próxima página.
+    query = query.order_by(key).offset(page.offset).limit(page.limit + 1)
+    rows = (await session.execute(query)).all()
+
+    next_cursor = None
+    if len(rows) > page.limit:
+        rows = rows[: page.limit]
+        next_cursor = encode_cursor(key, getattr(rows[-1], key.key))
+
+    return rows, next_cursor
+
+
+class Explain(Executable, ClauseElement):
+    inherit_cache = False
+
+    def __init__(self, statement: Select):
+        self.statement = statement
+
+
+@compiles(Explain, 'postgresql')
+def _compile_explain(element, compiler, **kw):
+    return 'EXPLAIN (FORMAT JSON) ' + compiler.process(element.statement, **kw)
+
+
+async def count_rows(session, query: Select, mode: str | None) -> int | None:
+    if mode is None:
+        return None
+
+    query = query.order_by(None)
+
+    if mode == 'estimated':
+        if query.whereclause is None:
+            # Estatística do último ANALYZE; -1 se a tabela nunca foi
+            # analisada.
+            (table,) = query.get_final_froms()
+            estimate = await session.scalar(
+                text(
+                    'SELECT reltuples::bigint FROM pg_class '
+                    'WHERE oid = CAST(:table AS regclass)'
+                ),
+                {'table': table.name},
+            )
+        else:
+            plan = await session.scalar(Explain(query))
+            estimate = plan[0]['Plan']['Plan Rows']
+
+        if estimate >= 0:
+            return int(estimate)
+
+    # Só o count(*) sobre o mesmo FROM/WHERE, para o planner poder usar
+    # um index-only scan.
+    return await session.scalar(
+        query.with_only_columns(func.count(), maintain_column_froms=True)
+    )
+
+
+def total_count_headers(total: int | None) -> dict:
+    return {} if total is None else {'X-Total-Count': str(total)}
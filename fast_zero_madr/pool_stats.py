@@ -0,0 +1,89 @@
+from threading import Lock
+from time import perf_counter
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+
+class PoolStats:
+    def __init__(self):
+        self._lock = Lock()
+        self._engine = None
+        self.checkouts = 0
+        self.checkout_wait_total = 0.0
+        self.checkout_wait_max = 0.0
+        self.connects = 0
+        self.closes = 0
+        self.invalidations = 0
+
+    def attach(self, engine: Engine):
+        self._engine = engine
+        engine.pool.stats = self
+
+        event.listen(engine, 'connect', self._on_connect)
+        event.listen(engine, 'close', self._on_close)
+        event.listen(engine, 'close_detached', self._on_close)
+        event.listen(engine, 'invalidate', self._on_invalidate)
+        event.listen(engine, 'soft_invalidate', self._on_invalidate)
+
+    def record_checkout(self, wait: float):
+        with self._lock:
+            self.checkouts += 1
+            self.checkout_wait_total += wait
+            self.checkout_wait_max = max(self.checkout_wait_max, wait)
+
+    def snapshot(self) -> dict:
+        pool = self._engine.pool
+
+        with self._lock:
+            return {
+                'size': pool.size(),
+                'checked_out': pool.checkedout(),
+                'checked_in': pool.checkedin(),
+                'overflow': max(pool.overflow(), 0),
+                'checkouts': self.checkouts,
+                'checkout_wait_total': self.checkout_wait_total,
+                'checkout_wait_max': self.checkout_wait_max,
+                'connects': self.connects,
+                'closes': self.closes,
+                'invalidations': self.invalidations,
+            }
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.connects += 1
+
+    def _on_close(self, dbapi_connection, *args):
+        with self._lock:
+            self.closes += 1
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        with self._lock:
+            self.invalidations += 1
+
+
+class _TimedCheckout:
+    # Nenhum evento de pool dispara antes da espera por uma conexão, então
+    # o tempo de checkout é medido em volta do próprio Pool.connect().
+    stats: PoolStats | None = None
+
+    def connect(self):
+        start = perf_counter()
+        connection = super().connect()
+        if self.stats:
+            self.stats.record_checkout(perf_counter() - start)
+        return connection
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class TimedAsyncAdaptedQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
@@ -4,7 +4,7 @@ from typing import Annotated
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from fast_zero_madr.database import get_session
 from fast_zero_madr.models import User
@@ -12,21 +12,24 @@ from fast_zero_madr.schemas import Token
 from fast_zero_madr.security import (
     create_access_token,
     get_current_user,
-    verify_password,
+    invalidate_user,
+    verify_and_update_password,
 )
 
 router = APIRouter(prefix='/auth', tags=['auth'])
 
-T_Session = Annotated[Session, Depends(get_session)]
+T_Session = Annotated[AsyncSession, Depends(get_session)]
 T_OAuth2Form = Annotated[OAuth2PasswordRequestForm, Depends()]
 
 
 @router.post('/token/', response_model=Token)
-def login_for_access_token(
+async def login_for_access_token(
     session: T_Session,
     form_data: T_OAuth2Form,
 ):
-    user = session.scalar(select(User).where(User.email == form_data.username))
+    user = await session.scalar(
+        select(User).where(User.email == form_data.username)
+    )
 
     if not user:
         raise HTTPException(
@@ -34,19 +37,29 @@ def login_for_access_token(
             detail='Email ou senha incorretos',
         )
 
-    if not verify_password(form_data.password, user.senha):
+    valid, updated_hash = await verify_and_update_password(
+        form_data.password, user.senha
+    )
+
+    if not valid:
         raise HTTPException(
             status_code=HTTPStatus.BAD_REQUEST,
             detail='Email ou senha incorretos',
         )
 
+    # Parâmetros do Argon2 mudaram: regrava o hash com os atuais.
+    if updated_hash:
+        user.senha = updated_hash
+        await session.commit()
+        invalidate_user(user.email)
+
     access_token = create_access_token(data={'sub': user.email})
 
     return {'access_token': access_token, 'token_type': 'bearer'}
 
 
 @router.post('/refresh_token', response_model=Token)
-def refresh_access_token(
+async def refresh_access_token(
     user: User = Depends(get_current_user),
 ):
     new_access_token = create_access_token(data={'sub': user.email})
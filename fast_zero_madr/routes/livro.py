@@ -1,25 +1,80 @@
+from collections.abc import Callable
+from contextlib import AbstractAsyncContextManager
+from dataclasses import astuple, dataclass
 from http import HTTPStatus
-from typing import Annotated
-
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy import select
-from sqlalchemy.orm import Session
-
-from fast_zero_madr.database import get_session
-from fast_zero_madr.models import Livro, User
+from itertools import batched
+from typing import Annotated, Literal
+
+from fastapi import APIRouter, Body, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Select, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from fast_zero_madr.cache import query_cache
+from fast_zero_madr.database import (
+    get_read_session,
+    get_session,
+    get_session_scope,
+    is_unique_violation,
+    may_cache,
+    read_cache_scope,
+)
+from fast_zero_madr.etag import T_ConditionalGet, strong_etag
+from fast_zero_madr.export import MEDIA_TYPES, encode_rows, gzip_stream
+from fast_zero_madr.models import LIVRO_LIST_COLUMNS, Livro, Romancista, User
+from fast_zero_madr.pagination import (
+    T_OffsetPage,
+    T_Page,
+    count_rows,
+    paginate,
+    total_count_headers,
+)
 from fast_zero_madr.schemas import (
+    LivroBulkResult,
     LivroPublic,
     LivroPublicList,
     LivroSchema,
     Message,
 )
+from fast_zero_madr.search import ranked_search, unaccent_contains
 from fast_zero_madr.security import get_current_user
+from fast_zero_madr.serialization import TrustedJSONResponse, encode_trusted
+from fast_zero_madr.settings import Settings
 
 router = APIRouter(prefix='/livro', tags=['livro'])
 
+settings = Settings()
+
 
-T_Session = Annotated[Session, Depends(get_session)]
+T_Session = Annotated[AsyncSession, Depends(get_session)]
+T_ReadSession = Annotated[AsyncSession, Depends(get_read_session)]
 T_CurrentUser = Annotated[User, Depends(get_current_user)]
+T_SessionScope = Annotated[
+    Callable[[], AbstractAsyncContextManager], Depends(get_session_scope)
+]
+
+
+@dataclass
+class LivroFilter:
+    titulo: str = Query(None)
+    ano: int = Query(None)
+
+
+T_LivroFilter = Annotated[LivroFilter, Depends()]
+
+
+def filter_livros(filtro: LivroFilter) -> Select:
+    query = select(*LIVRO_LIST_COLUMNS)
+
+    if filtro.titulo:
+        query = query.filter(unaccent_contains(Livro.titulo, filtro.titulo))
+
+    if filtro.ano:
+        query = query.filter(Livro.ano == filtro.ano)
+
+    return query
 
 
 @router.post(
@@ -35,74 +90,254 @@ T_CurrentUser = Annotated[User, Depends(get_current_user)]
         500: {'model': Message, 'description': 'Internal Server Error'},
     },
 )
-def create_livro(livro: LivroSchema, session: T_Session, _: T_CurrentUser):
-    db_livro = session.scalar(
-        select(Livro).where(Livro.titulo == livro.titulo)
-    )
+async def create_livro(
+    livro: LivroSchema, session: T_Session, _: T_CurrentUser
+):
+    # Uma única ida ao banco; a constraint única resolve a disputa entre
+    # dois cadastros simultâneos do mesmo título. O RETURNING traz só as
+    # colunas da resposta, sem o tsvector de busca.
+    db_livro = (
+        await session.execute(
+            insert(Livro)
+            .values(**livro.model_dump())
+            .on_conflict_do_nothing(index_elements=['titulo'])
+            .returning(Livro.id, Livro.titulo, Livro.ano, Livro.id_romancista)
+        )
+    ).first()
 
-    if db_livro:
+    if not db_livro:
         raise HTTPException(
             status_code=HTTPStatus.CONFLICT,
             detail='Romancista já cadastrado',
         )
 
-    db_livro = Livro(
-        titulo=livro.titulo, ano=livro.ano, id_romancista=livro.id_romancista
+    await session.commit()
+    query_cache.invalidate('livros')
+
+    return db_livro
+
+
+@router.post(
+    '/bulk', status_code=HTTPStatus.CREATED, response_model=LivroBulkResult
+)
+async def create_livros_bulk(
+    livros: Annotated[
+        list[LivroSchema], Body(max_length=settings.BULK_MAX_ITEMS)
+    ],
+    session: T_Session,
+    _: T_CurrentUser,
+):
+    conflicts = []
+
+    # FOR KEY SHARE impede que os romancistas sumam antes do INSERT.
+    romancista_ids = set(
+        await session.scalars(
+            select(Romancista.id)
+            .where(
+                Romancista.id.in_({livro.id_romancista for livro in livros})
+            )
+            .with_for_update(key_share=True)
+        )
     )
 
-    session.add(db_livro)
-    session.commit()
-    session.refresh(db_livro)
+    pending = {}
+    for index, livro in enumerate(livros):
+        if livro.id_romancista not in romancista_ids:
+            conflicts.append({
+                'index': index,
+                'detail': 'Romancista não consta no MADR',
+            })
+        elif livro.titulo in pending:
+            conflicts.append({
+                'index': index,
+                'detail': 'livro já consta no MADR',
+            })
+        else:
+            pending[livro.titulo] = (index, livro)
+
+    created = []
+    for batch in batched(pending.values(), settings.BULK_BATCH_SIZE):
+        result = await session.execute(
+            insert(Livro)
+            .values([livro.model_dump() for _, livro in batch])
+            .on_conflict_do_nothing(index_elements=['titulo'])
+            .returning(Livro.id, Livro.titulo, Livro.ano, Livro.id_romancista)
+        )
+        created.extend(result.all())
 
-    return db_livro
+    await session.commit()
+    query_cache.invalidate('livros')
+
+    created_titulos = {row.titulo for row in created}
+    conflicts.extend(
+        {'index': index, 'detail': 'livro já consta no MADR'}
+        for titulo, (index, _) in pending.items()
+        if titulo not in created_titulos
+    )
+
+    return {
+        'livros': sorted(created, key=lambda row: pending[row.titulo][0]),
+        'conflicts': sorted(conflicts, key=lambda c: c['index']),
+    }
+
+
+@router.get('/export', response_class=StreamingResponse)
+async def export_livros(
+    session_scope: T_SessionScope,
+    _: T_CurrentUser,
+    formato: Literal['ndjson', 'csv'] = Query('ndjson'),
+    gzip: bool = Query(False),
+):
+    query = (
+        select(
+            Livro.id,
+            Livro.titulo,
+            Livro.ano,
+            Livro.id_romancista,
+            Romancista.nome.label('romancista'),
+        )
+        .join(Romancista)
+        .order_by(Livro.id)
+        .execution_options(yield_per=settings.EXPORT_BATCH_SIZE)
+    )
+
+    async def partitions():
+        async with session_scope() as session:
+            result = await session.stream(query)
+            async for partition in result.partitions():
+                yield partition
+
+    body = encode_rows(
+        partitions(), formato, list(query.selected_columns.keys())
+    )
+    headers = {}
+    if gzip:
+        body = gzip_stream(body)
+        headers['Content-Encoding'] = 'gzip'
+
+    return StreamingResponse(
+        body, media_type=MEDIA_TYPES[formato], headers=headers
+    )
+
+
+@router.get('/search', response_model=LivroPublicList)
+async def search_livros(
+    session: T_Session,
+    _: T_CurrentUser,
+    page: T_OffsetPage,
+    q: str = Query(min_length=1),
+):
+    query = ranked_search(
+        select(*LIVRO_LIST_COLUMNS), Livro.busca, q
+    ).order_by(Livro.id)
+
+    db_livros = (
+        await session.execute(query.offset(page.offset).limit(page.limit))
+    ).all()
+    total = await count_rows(session, query, page.with_count)
+
+    return TrustedJSONResponse(
+        encode_trusted(LivroPublicList, {'livros': db_livros}),
+        headers=total_count_headers(total),
+    )
 
 
 @router.get('/{livro_id}/', response_model=LivroPublic)
-def read_livro(
+async def read_livro(
     livro_id: int,
-    session: T_Session,
+    session: T_ReadSession,
     _: T_CurrentUser,
+    conditional: T_ConditionalGet,
 ):
-    db_livro = session.scalar(select(Livro).where(Livro.id == livro_id))
+    db_livro = await session.scalar(select(Livro).where(Livro.id == livro_id))
 
     if not db_livro:
         raise HTTPException(
             status_code=HTTPStatus.NOT_FOUND,
             detail='Livro não consta no MADR',
         )
-    return db_livro
+
+    etag = strong_etag(db_livro.id, db_livro.versao)
+    not_modified = conditional.not_modified(etag)
+    if not_modified:
+        return not_modified
+
+    return TrustedJSONResponse(
+        encode_trusted(LivroPublic, db_livro), headers={'ETag': etag}
+    )
 
 
 @router.get('/', response_model=LivroPublicList)
-def read_filter_livro(
-    session: T_Session,
+async def read_filter_livro(
+    session: T_ReadSession,
     _: T_CurrentUser,
-    titulo: str = Query(None),
-    ano: int = Query(None),
-    offset: int = Query(None),
-    limit: int = Query(None),
+    page: T_Page,
+    filtro: T_LivroFilter,
+    conditional: T_ConditionalGet,
 ):
-    query = select(Livro)
-
-    if titulo:
-        query = query.filter(Livro.titulo.contains(titulo))
-
-    if ano:
-        query = query.filter(Livro.ano == ano)
+    scope = read_cache_scope(session)
+    key = query_cache.key(
+        ('livros',),
+        (scope, filtro.titulo or None, filtro.ano or None, *astuple(page)),
+    )
+    cached = query_cache.get(key) if scope else None
+
+    if cached is None:
+        query = filter_livros(filtro)
+        db_livros, next_cursor = await paginate(session, query, Livro.id, page)
+        total = await count_rows(session, query, page.with_count)
+
+        cached = (
+            conditional.list_etag((
+                [(livro.id, livro.versao) for livro in db_livros],
+                next_cursor,
+                total,
+            )),
+            encode_trusted(
+                LivroPublicList,
+                {'livros': db_livros, 'next_cursor': next_cursor},
+            ),
+            total,
+        )
+        if may_cache(scope, query_cache.generations(key)):
+            query_cache.set(key, cached)
 
-    db_livros = session.scalars(query.offset(offset).limit(limit)).all()
+    etag, body, total = cached
+    not_modified = conditional.not_modified(etag)
+    if not_modified:
+        return not_modified
 
-    return {'livros': db_livros}
+    return TrustedJSONResponse(
+        body, headers={'ETag': etag, **total_count_headers(total)}
+    )
 
 
 @router.put('/{livro_id}/', response_model=LivroPublic)
-def update_livro(
+async def update_livro(
     livro_id: int,
     livro: LivroSchema,
     session: T_Session,
     _: T_CurrentUser,
 ):
-    db_livro = session.scalar(select(Livro).where(Livro.id == livro_id))
+    try:
+        db_livro = (
+            await session.execute(
+                update(Livro)
+                .where(Livro.id == livro_id)
+                .values(**livro.model_dump())
+                .returning(
+                    Livro.id, Livro.titulo, Livro.ano, Livro.id_romancista
+                )
+            )
+        ).first()
+    except IntegrityError as exc:
+        await session.rollback()
+        if not is_unique_violation(exc):
+            raise
+        raise HTTPException(
+            status_code=HTTPStatus.CONFLICT,
+            detail='livro já consta no MADR',
+        )
 
     if not db_livro:
         raise HTTPException(
@@ -110,39 +345,27 @@ def update_livro(
             detail='livro não consta no MADR',
         )
 
-    mew_titulo = session.scalar(
-        select(Livro).where(Livro.titulo == livro.titulo)
-    )
-
-    if mew_titulo:
-        raise HTTPException(
-            status_code=HTTPStatus.CONFLICT,
-            detail='livro já consta no MADR',
-        )
-
-    for key, value in livro.model_dump(exclude_unset=True).items():
-        setattr(db_livro, key, value)
-
-    session.commit()
-    session.refresh(db_livro)
+    await session.commit()
+    query_cache.invalidate('livros')
 
     return db_livro
 
 
 @router.delete('/{livro_id}/', response_model=LivroPublic)
-def delete_livro(
+async def delete_livro(
     livro_id: int,
     session: T_Session,
     _: T_CurrentUser,
 ):
-    db_livro = session.scalar(select(Livro).where(Livro.id == livro_id))
+    db_livro = await session.scalar(select(Livro).where(Livro.id == livro_id))
     if not db_livro:
         raise HTTPException(
             status_code=HTTPStatus.NOT_FOUND,
             detail='livro não consta no MADR',
         )
 
-    session.delete(db_livro)
-    session.commit()
+    await session.delete(db_livro)
+    await session.commit()
+    query_cache.invalidate('livros')
 
     return db_livro
@@ -0,0 +1,11 @@
+from fastapi import APIRouter, Response
+
+from fast_zero_madr.metrics import CONTENT_TYPE, metrics
+
+router = APIRouter(tags=['metrics'])
+
+
+@router.get('/metrics', include_in_schema=False)
+def read_metrics():
+    # Síncrona: com vários workers, a leitura dos snapshots vai ao disco.
+    return Response(metrics.render(), media_type=CONTENT_TYPE)
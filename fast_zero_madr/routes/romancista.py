@@ -1,27 +1,72 @@
+from collections import defaultdict
+from dataclasses import astuple, dataclass
 from http import HTTPStatus
-from typing import Annotated
+from itertools import batched
+from typing import Annotated, Literal
 
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy import select
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Body, Depends, HTTPException, Query
+from sqlalchemy import Select, delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from fast_zero_madr.database import get_session
-from fast_zero_madr.models import Romancista, User
+from fast_zero_madr.cache import query_cache
+from fast_zero_madr.database import (
+    get_read_session,
+    get_session,
+    is_unique_violation,
+    may_cache,
+    read_cache_scope,
+)
+from fast_zero_madr.etag import T_ConditionalGet, strong_etag
+from fast_zero_madr.models import (
+    LIVRO_LIST_COLUMNS,
+    ROMANCISTA_LIST_COLUMNS,
+    Livro,
+    Romancista,
+    User,
+)
+from fast_zero_madr.pagination import (
+    T_OffsetPage,
+    T_Page,
+    count_rows,
+    encode_cursor,
+    paginate,
+    total_count_headers,
+)
 from fast_zero_madr.schemas import (
+    LivroPublicList,
     Message,
+    RomancistaBulkResult,
+    RomancistaLivrosPublicList,
     RomancistaPublic,
     RomancistaPublicList,
     RomancistaSchema,
 )
+from fast_zero_madr.search import ranked_search, unaccent_contains
 from fast_zero_madr.security import get_current_user
+from fast_zero_madr.serialization import TrustedJSONResponse, encode_trusted
+from fast_zero_madr.settings import Settings
 
 router = APIRouter(prefix='/romancista', tags=['romancista'])
 
+settings = Settings()
+
 
-T_Session = Annotated[Session, Depends(get_session)]
+T_Session = Annotated[AsyncSession, Depends(get_session)]
+T_ReadSession = Annotated[AsyncSession, Depends(get_read_session)]
 T_CurrentUser = Annotated[User, Depends(get_current_user)]
 
 
+@dataclass
+class RomancistaFilter:
+    nome: str = Query(None)
+    include: Literal['livros'] | None = Query(None)
+
+
+T_RomancistaFilter = Annotated[RomancistaFilter, Depends()]
+
+
 @router.post(
     '/',
     status_code=HTTPStatus.CREATED,
@@ -35,35 +80,110 @@ T_CurrentUser = Annotated[User, Depends(get_current_user)]
         500: {'model': Message, 'description': 'Internal Server Error'},
     },
 )
-def create_romancista(
+async def create_romancista(
     romancista: RomancistaSchema, session: T_Session, _: T_CurrentUser
 ):
-    db_romancista = session.scalar(
-        select(Romancista).where(Romancista.nome == romancista.nome)
-    )
+    db_romancista = (
+        await session.execute(
+            insert(Romancista)
+            .values(nome=romancista.nome)
+            .on_conflict_do_nothing(index_elements=['nome'])
+            .returning(Romancista.id, Romancista.nome)
+        )
+    ).first()
 
-    if db_romancista:
+    if not db_romancista:
         raise HTTPException(
             status_code=HTTPStatus.CONFLICT,
             detail='Romancista já cadastrado',
         )
 
-    db_romancista = Romancista(nome=romancista.nome)
-
-    session.add(db_romancista)
-    session.commit()
-    session.refresh(db_romancista)
+    await session.commit()
+    query_cache.invalidate('romancistas')
 
     return db_romancista
 
 
+@router.post(
+    '/bulk',
+    status_code=HTTPStatus.CREATED,
+    response_model=RomancistaBulkResult,
+)
+async def create_romancistas_bulk(
+    romancistas: Annotated[
+        list[RomancistaSchema], Body(max_length=settings.BULK_MAX_ITEMS)
+    ],
+    session: T_Session,
+    _: T_CurrentUser,
+):
+    conflicts = []
+
+    pending = {}
+    for index, romancista in enumerate(romancistas):
+        if romancista.nome in pending:
+            conflicts.append({
+                'index': index,
+                'detail': 'Romancista já cadastrado',
+            })
+        else:
+            pending[romancista.nome] = index
+
+    created = []
+    for batch in batched(pending, settings.BULK_BATCH_SIZE):
+        result = await session.execute(
+            insert(Romancista)
+            .values([{'nome': nome} for nome in batch])
+            .on_conflict_do_nothing(index_elements=['nome'])
+            .returning(Romancista.id, Romancista.nome)
+        )
+        created.extend(result.all())
+
+    await session.commit()
+    query_cache.invalidate('romancistas')
+
+    created_nomes = {row.nome for row in created}
+    conflicts.extend(
+        {'index': index, 'detail': 'Romancista já cadastrado'}
+        for nome, index in pending.items()
+        if nome not in created_nomes
+    )
+
+    return {
+        'romancistas': sorted(created, key=lambda row: pending[row.nome]),
+        'conflicts': sorted(conflicts, key=lambda c: c['index']),
+    }
+
+
+@router.get('/search', response_model=RomancistaPublicList)
+async def search_romancistas(
+    session: T_Session,
+    _: T_CurrentUser,
+    page: T_OffsetPage,
+    q: str = Query(min_length=1),
+):
+    query = ranked_search(
+        select(*ROMANCISTA_LIST_COLUMNS), Romancista.busca, q
+    ).order_by(Romancista.id)
+
+    db_romancistas = (
+        await session.execute(query.offset(page.offset).limit(page.limit))
+    ).all()
+    total = await count_rows(session, query, page.with_count)
+
+    return TrustedJSONResponse(
+        encode_trusted(RomancistaPublicList, {'romancistas': db_romancistas}),
+        headers=total_count_headers(total),
+    )
+
+
 @router.get('/{romancista_id}/', response_model=RomancistaPublic)
-def read_romancista(
+async def read_romancista(
     romancista_id: int,
-    session: T_Session,
+    session: T_ReadSession,
     _: T_CurrentUser,
+    conditional: T_ConditionalGet,
 ):
-    db_romancista = session.scalar(
+    db_romancista = await session.scalar(
         select(Romancista).where(Romancista.id == romancista_id)
     )
 
@@ -72,36 +192,31 @@ def read_romancista(
             status_code=HTTPStatus.NOT_FOUND,
             detail='Romancista não consta no MADR',
         )
-    return db_romancista
 
+    etag = strong_etag(db_romancista.id, db_romancista.versao)
+    not_modified = conditional.not_modified(etag)
+    if not_modified:
+        return not_modified
 
-@router.get('/', response_model=RomancistaPublicList)
-def read_filter_romancistas(
-    session: T_Session,
-    _: T_CurrentUser,
-    nome: str = Query(None),
-    offset: int = Query(None),
-    limit: int = Query(None),
-):
-    query = select(Romancista)
-
-    if nome:
-        query = query.filter(Romancista.nome.contains(nome))
-
-    db_romancista = session.scalars(query.offset(offset).limit(limit)).all()
-
-    return {'romancistas': db_romancista}
+    return TrustedJSONResponse(
+        encode_trusted(RomancistaPublic, db_romancista),
+        headers={'ETag': etag},
+    )
 
 
-@router.put('/{romancista_id}/', response_model=RomancistaPublic)
-def update_romancista(
+@router.get(
+    '/{romancista_id}/livros/',
+    response_model=LivroPublicList,
+)
+async def read_romancista_livros(
     romancista_id: int,
-    romancista: RomancistaSchema,
     session: T_Session,
     _: T_CurrentUser,
+    page: T_Page,
+    conditional: T_ConditionalGet,
 ):
-    db_romancista = session.scalar(
-        select(Romancista).where(Romancista.id == romancista_id)
+    db_romancista = await session.scalar(
+        select(Romancista.id).where(Romancista.id == romancista_id)
     )
 
     if not db_romancista:
@@ -110,39 +225,208 @@ def update_romancista(
             detail='Romancista não consta no MADR',
         )
 
-    db_new = session.scalar(
-        select(Romancista).where(Romancista.nome == romancista.nome)
+    query = select(*LIVRO_LIST_COLUMNS).where(
+        Livro.id_romancista == romancista_id
     )
+    db_livros, next_cursor = await paginate(session, query, Livro.id, page)
+    total = await count_rows(session, query, page.with_count)
+
+    etag = conditional.list_etag((
+        [(livro.id, livro.versao) for livro in db_livros],
+        next_cursor,
+        total,
+    ))
+    not_modified = conditional.not_modified(etag)
+    if not_modified:
+        return not_modified
 
-    if db_new:
+    return TrustedJSONResponse(
+        encode_trusted(
+            LivroPublicList, {'livros': db_livros, 'next_cursor': next_cursor}
+        ),
+        headers={'ETag': etag, **total_count_headers(total)},
+    )
+
+
+@router.get(
+    '/',
+    response_model=RomancistaLivrosPublicList | RomancistaPublicList,
+)
+async def read_filter_romancistas(
+    session: T_ReadSession,
+    _: T_CurrentUser,
+    page: T_Page,
+    filtro: T_RomancistaFilter,
+    conditional: T_ConditionalGet,
+):
+    tables = ('romancistas', 'livros') if filtro.include else ('romancistas',)
+    scope = read_cache_scope(session)
+    key = query_cache.key(
+        tables, (scope, filtro.nome or None, filtro.include, *astuple(page))
+    )
+    cached = query_cache.get(key) if scope else None
+
+    if cached is None:
+        cached = await _query_romancistas(session, page, filtro, conditional)
+        if may_cache(scope, query_cache.generations(key)):
+            query_cache.set(key, cached)
+
+    etag, body, total = cached
+    not_modified = conditional.not_modified(etag)
+    if not_modified:
+        return not_modified
+
+    return TrustedJSONResponse(
+        body, headers={'ETag': etag, **total_count_headers(total)}
+    )
+
+
+def filter_romancistas(filtro: RomancistaFilter) -> Select:
+    query = select(*ROMANCISTA_LIST_COLUMNS)
+
+    if filtro.nome:
+        query = query.filter(unaccent_contains(Romancista.nome, filtro.nome))
+
+    return query
+
+
+async def livros_by_romancista(session, ids: list[int], limit: int) -> dict:
+    # Uma única consulta (IN) traz os livros de toda a página, no máximo
+    # limit + 1 por romancista: o excedente indica que há mais.
+    livros = defaultdict(list)
+    if ids:
+        ranked = (
+            select(
+                *LIVRO_LIST_COLUMNS,
+                func
+                .row_number()
+                .over(partition_by=Livro.id_romancista, order_by=Livro.id)
+                .label('posicao'),
+            )
+            .where(Livro.id_romancista.in_(ids))
+            .subquery()
+        )
+        result = await session.execute(
+            select(*(ranked.c[column.key] for column in LIVRO_LIST_COLUMNS))
+            .where(ranked.c.posicao <= limit + 1)
+            .order_by(ranked.c.id)
+        )
+        for livro in result:
+            livros[livro.id_romancista].append(livro)
+    return livros
+
+
+def embed_livros(row, livros: list, limit: int) -> dict:
+    livros_next = None
+    if len(livros) > limit:
+        livros = livros[:limit]
+        cursor = encode_cursor(Livro.id, livros[-1].id)
+        livros_next = f'{router.prefix}/{row.id}/livros/?cursor={cursor}'
+
+    return {**row._asdict(), 'livros': livros, 'livros_next': livros_next}
+
+
+async def _query_romancistas(session, page, filtro, conditional):
+    query = filter_romancistas(filtro)
+    rows, next_cursor = await paginate(session, query, Romancista.id, page)
+    total = await count_rows(session, query, page.with_count)
+
+    if not filtro.include:
+        etag = conditional.list_etag((
+            [(row.id, row.versao) for row in rows],
+            next_cursor,
+            total,
+        ))
+        body = encode_trusted(
+            RomancistaPublicList,
+            {'romancistas': rows, 'next_cursor': next_cursor},
+        )
+        return etag, body, total
+
+    limit = settings.INCLUDE_LIVROS_MAX
+    livros = await livros_by_romancista(
+        session, [row.id for row in rows], limit
+    )
+    romancistas = [embed_livros(row, livros[row.id], limit) for row in rows]
+
+    etag = conditional.list_etag((
+        [
+            (
+                romancista['id'],
+                romancista['versao'],
+                [(livro.id, livro.versao) for livro in romancista['livros']],
+                romancista['livros_next'],
+            )
+            for romancista in romancistas
+        ],
+        next_cursor,
+        total,
+    ))
+    body = encode_trusted(
+        RomancistaLivrosPublicList,
+        {'romancistas': romancistas, 'next_cursor': next_cursor},
+    )
+    return etag, body, total
+
+
+@router.put('/{romancista_id}/', response_model=RomancistaPublic)
+async def update_romancista(
+    romancista_id: int,
+    romancista: RomancistaSchema,
+    session: T_Session,
+    _: T_CurrentUser,
+):
+    try:
+        db_romancista = (
+            await session.execute(
+                update(Romancista)
+                .where(Romancista.id == romancista_id)
+                .values(nome=romancista.nome)
+                .returning(Romancista.id, Romancista.nome)
+            )
+        ).first()
+    except IntegrityError as exc:
+        await session.rollback()
+        if not is_unique_violation(exc):
+            raise
         raise HTTPException(
             status_code=HTTPStatus.CONFLICT,
             detail='romancista já consta no MADR',
         )
 
-    db_romancista.nome = romancista.nome
-    session.commit()
-    session.refresh(db_romancista)
+    if not db_romancista:
+        raise HTTPException(
+            status_code=HTTPStatus.NOT_FOUND,
+            detail='Romancista não consta no MADR',
+        )
+
+    await session.commit()
+    query_cache.invalidate('romancistas')
 
     return db_romancista
 
 
 @router.delete('/{romancista_id}/', response_model=RomancistaPublic)
-def delete_romancista(
+async def delete_romancista(
     romancista_id: int,
     session: T_Session,
     _: T_CurrentUser,
 ):
-    db_romancista = session.scalar(
-        select(Romancista).where(Romancista.id == romancista_id)
-    )
+    # Os livros do romancista são removidos pelo ON DELETE CASCADE.
+    db_romancista = (
+        await session.execute(
+            delete(Romancista)
+            .where(Romancista.id == romancista_id)
+            .returning(Romancista.id, Romancista.nome)
+        )
+    ).first()
     if not db_romancista:
         raise HTTPException(
             status_code=HTTPStatus.NOT_FOUND,
             detail='Romancista não consta no MADR',
         )
 
-    session.delete(db_romancista)
-    session.commit()
+    await session.commit()
+    query_cache.invalidate('romancistas', 'livros')
 
     return db_romancista
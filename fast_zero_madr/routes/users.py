@@ -3,54 +3,59 @@ from typing import Annotated
 
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from fast_zero_madr.database import get_session
 from fast_zero_madr.models import User
 from fast_zero_madr.schemas import Message, UserPublic, UserSchema
-from fast_zero_madr.security import get_current_user, get_password_hash
+from fast_zero_madr.security import (
+    get_current_user,
+    hash_password,
+    invalidate_user,
+)
+from fast_zero_madr.serialization import TrustedJSONResponse, encode_trusted
 
 router = APIRouter(prefix='/user', tags=['user'])
 
-T_Session = Annotated[Session, Depends(get_session)]
+T_Session = Annotated[AsyncSession, Depends(get_session)]
 T_CurrentUser = Annotated[User, Depends(get_current_user)]
 
 
 @router.post('/', status_code=HTTPStatus.CREATED, response_model=UserPublic)
-def create_user(user: UserSchema, session: T_Session):
-    db_user = session.scalar(
-        select(User).where(
-            (User.username == user.username) | (User.email == user.email)
+async def create_user(user: UserSchema, session: T_Session):
+    hashed_password = await hash_password(user.senha)
+
+    db_user = await session.scalar(
+        insert(User)
+        .values(
+            username=user.username, senha=hashed_password, email=user.email
         )
+        .on_conflict_do_nothing()
+        .returning(User)
     )
 
-    if db_user:
-        if db_user.username == user.username:
-            raise HTTPException(
-                status_code=HTTPStatus.BAD_REQUEST,
-                detail='Conta já cadastrada',
-            )
-        elif db_user.email == user.email:
-            raise HTTPException(
-                status_code=HTTPStatus.BAD_REQUEST,
-                detail='Email já cadastrado',
-            )
-
-    hashed_password = get_password_hash(user.senha)
-
-    db_user = User(
-        username=user.username, senha=hashed_password, email=user.email
-    )
+    if not db_user:
+        # Só no caminho de conflito: descobre qual das constraints falhou.
+        username_taken = await session.scalar(
+            select(User.id).where(User.username == user.username)
+        )
+        raise HTTPException(
+            status_code=HTTPStatus.BAD_REQUEST,
+            detail='Conta já cadastrada'
+            if username_taken
+            else 'Email já cadastrado',
+        )
 
-    session.add(db_user)
-    session.commit()
-    session.refresh(db_user)
+    await session.commit()
 
-    return db_user
+    return TrustedJSONResponse(
+        encode_trusted(UserPublic, db_user), status_code=HTTPStatus.CREATED
+    )
 
 
 @router.put('/{user_id}', response_model=UserPublic)
-def update_user(
+async def update_user(
     user_id: int,
     user: UserSchema,
     session: T_Session,
@@ -61,17 +66,20 @@ def update_user(
             status_code=HTTPStatus.FORBIDDEN, detail='Não autorizado'
         )
 
+    old_email = current_user.email
     current_user.username = user.username
-    current_user.senha = get_password_hash(user.senha)
+    current_user.senha = await hash_password(user.senha)
     current_user.email = user.email
-    session.commit()
-    session.refresh(current_user)
+    await session.commit()
+    await session.refresh(current_user)
 
-    return current_user
+    invalidate_user(old_email)
+
+    return TrustedJSONResponse(encode_trusted(UserPublic, current_user))
 
 
 @router.delete('/{user_id}', response_model=Message)
-def delete_user(
+async def delete_user(
     user_id: int,
     session: T_Session,
     current_user: T_CurrentUser,
@@ -81,7 +89,9 @@ def delete_user(
             status_code=HTTPStatus.FORBIDDEN, detail='Não autorizado'
         )
 
-    session.delete(current_user)
-    session.commit()
+    await session.delete(current_user)
+    await session.commit()
+
+    invalidate_user(current_user.email)
 
     return {'message': 'Conta deletada com sucesso'}
@@ -34,6 +34,11 @@ class TokenData(BaseModel):
     username: str | None = None
 
 
+class BulkConflict(BaseModel):
+    index: int
+    detail: str
+
+
 class RomancistaSchema(BaseModel):
     nome: str
 
@@ -46,6 +51,22 @@ class RomancistaPublic(RomancistaSchema):
 
 class RomancistaPublicList(BaseModel):
     romancistas: list[RomancistaPublic]
+    next_cursor: str | None = None
+
+
+class RomancistaLivrosPublic(RomancistaPublic):
+    livros: list['LivroPublic']
+    livros_next: str | None = None
+
+
+class RomancistaLivrosPublicList(BaseModel):
+    romancistas: list[RomancistaLivrosPublic]
+    next_cursor: str | None = None
+
+
+class RomancistaBulkResult(BaseModel):
+    romancistas: list[RomancistaPublic]
+    conflicts: list[BulkConflict]
 
 
 class LivroSchema(BaseModel):
@@ -62,3 +83,9 @@ class LivroPublic(LivroSchema):
 
 class LivroPublicList(BaseModel):
     livros: list[LivroPublic]
+    next_cursor: str | None = None
+
+
+class LivroBulkResult(BaseModel):
+    livros: list[LivroPublic]
+    conflicts: list[BulkConflict]
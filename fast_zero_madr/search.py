@@ -0,0 +1,23 @@
+from sqlalchemy import Select, cast, func
+from sqlalchemy.dialects.postgresql import REGCONFIG
+
+SEARCH_CONFIG = 'portuguese'
+
+
+def unaccent_contains(column, value: str):
+    # Mesma expressão dos índices trigram, para que o planner os use.
+    pattern = value.replace('/', '//').replace('%', '/%').replace('_', '/_')
+
+    return func.f_unaccent(column).ilike(
+        func.f_unaccent(f'%{pattern}%'), escape='/'
+    )
+
+
+def ranked_search(query: Select, vector, q: str) -> Select:
+    ts_query = func.websearch_to_tsquery(
+        cast(SEARCH_CONFIG, REGCONFIG), func.f_unaccent(q)
+    )
+
+    return query.where(vector.bool_op('@@')(ts_query)).order_by(
+        func.ts_rank(vector, ts_query).desc()
+    )
@@ -1,21 +1,49 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from functools import partial
+from hashlib import sha256
 from http import HTTPStatus
+from threading import Lock
+from time import perf_counter, time
 
 from fastapi import Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer
 from jwt import DecodeError, ExpiredSignatureError, decode, encode
 from pwdlib import PasswordHash
+from pwdlib.hashers.argon2 import Argon2Hasher
 from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
 from zoneinfo import ZoneInfo
 
-from fast_zero_madr.database import get_session
+from fast_zero_madr.cache import SharedStamps, TTLCache
+from fast_zero_madr.database import (
+    get_read_session,
+    get_session,
+    may_cache,
+    read_cache_scope,
+)
+from fast_zero_madr.metrics import hash_samples, metrics
 from fast_zero_madr.models import User
 from fast_zero_madr.schemas import TokenData
 from fast_zero_madr.settings import Settings
 
 settings = Settings()
-pwd_context = PasswordHash.recommended()
+pwd_context = PasswordHash((
+    Argon2Hasher(
+        time_cost=settings.ARGON2_TIME_COST,
+        memory_cost=settings.ARGON2_MEMORY_COST,
+        parallelism=settings.ARGON2_PARALLELISM,
+    ),
+))
+user_cache = TTLCache(settings.USER_CACHE_SIZE, settings.USER_CACHE_TTL)
+# O cache é de cada worker; a versão de cada email é compartilhada, então
+# uma alteração num worker descarta as cópias de todos.
+user_versions = SharedStamps(settings.USER_CACHE_SIZE)
+token_cache = TTLCache(
+    settings.TOKEN_CACHE_SIZE, settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+)
 
 
 def create_access_token(data: dict):
@@ -30,6 +58,78 @@ def create_access_token(data: dict):
     return encoded_jwt
 
 
+def decode_access_token(token: str) -> dict:
+    key = sha256(token.encode()).digest()
+
+    payload = token_cache.get(key)
+    if payload and payload['exp'] > time():
+        return payload
+
+    payload = decode(
+        token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
+    )
+    # Sem 'exp' não há como saber até quando a entrada é válida.
+    if 'exp' in payload:
+        token_cache.set(key, payload, ttl=payload['exp'] - time())
+
+    return payload
+
+
+class HashExecutor:
+    # O argon2-cffi libera o GIL durante o hash; um pool de threads próprio
+    # limita a concorrência sem ocupar o threadpool das rotas.
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self.queued = 0
+        self.running = 0
+        self._lock = Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix='argon2'
+        )
+
+    async def run(self, fn, *args):
+        with self._lock:
+            self.queued += 1
+
+        future = self._executor.submit(self._call, fn, *args)
+        future.add_done_callback(self._discard_cancelled)
+
+        return await asyncio.wrap_future(future)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'max_workers': self.max_workers,
+                'queued': self.queued,
+                'running': self.running,
+            }
+
+    def _call(self, fn, *args):
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+        start = perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            metrics.observe(
+                'password_hash_duration_seconds',
+                (('operation', fn.__name__),),
+                perf_counter() - start,
+            )
+            with self._lock:
+                self.running -= 1
+
+    def _discard_cancelled(self, future):
+        if future.cancelled():
+            with self._lock:
+                self.queued -= 1
+
+
+hash_executor = HashExecutor(settings.HASH_WORKERS)
+metrics.add_collector(partial(hash_samples, hash_executor))
+
+
 def get_password_hash(password: str):
     return pwd_context.hash(password)
 
@@ -38,11 +138,48 @@ def verify_password(plain_password: str, hashed_password: str):
     return pwd_context.verify(plain_password, hashed_password)
 
 
+async def hash_password(password: str) -> str:
+    return await hash_executor.run(pwd_context.hash, password)
+
+
+async def verify_and_update_password(
+    plain_password: str, hashed_password: str
+) -> tuple[bool, str | None]:
+    return await hash_executor.run(
+        pwd_context.verify_and_update, plain_password, hashed_password
+    )
+
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl='auth/token')
 
 
-def get_current_user(
-    session: Session = Depends(get_session),
+def cache_user(user: User, version: int):
+    user_cache.set(
+        user.email, (version, user.id, user.username, user.senha, user.email)
+    )
+
+
+def cached_user(email: str):
+    cached = user_cache.get(email)
+    if not cached or cached[0] != user_versions.get(email):
+        return None
+
+    _, user_id, username, senha, email = cached
+    user = User(username=username, senha=senha, email=email)
+    user.id = user_id
+    make_transient_to_detached(user)
+
+    return user
+
+
+def invalidate_user(email: str):
+    user_cache.pop(email)
+    user_versions.touch(email)
+
+
+async def get_current_user(
+    session: AsyncSession = Depends(get_session),
+    read_session: AsyncSession = Depends(get_read_session),
     token: str = Depends(oauth2_scheme),
 ):
     credentials_exception = HTTPException(
@@ -52,9 +189,7 @@ def get_current_user(
     )
 
     try:
-        payload = decode(
-            token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
-        )
+        payload = decode_access_token(token)
         username: str = payload.get('sub')
         if not username:
             raise credentials_exception
@@ -64,11 +199,26 @@ def get_current_user(
     except ExpiredSignatureError:
         raise credentials_exception
 
-    user = session.scalar(
+    user = cached_user(token_data.username)
+    if user:
+        # load=False anexa a cópia em cache à sessão sem ir ao banco.
+        return await session.merge(user, load=False)
+
+    # Lida antes da consulta: uma alteração concluída durante ela muda a
+    # versão e a cópia nasce inválida.
+    version = user_versions.get(token_data.username)
+    user = await read_session.scalar(
         select(User).where(User.email == token_data.username)
     )
 
     if not user:
         raise credentials_exception
 
-    return user
+    # Da réplica o usuário pode estar atrasado (até excluído) se a versão
+    # mudou há pouco; nesse caso a cópia não vai para o cache.
+    if may_cache(read_cache_scope(read_session), (version,)):
+        cache_user(user, version)
+
+    # A busca pode ter vindo da réplica; as rotas alteram o usuário pela
+    # sessão do primário.
+    return await session.merge(user, load=False)
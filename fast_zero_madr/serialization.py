@@ -0,0 +1,49 @@
+from functools import cache
+from typing import get_args, get_origin, get_type_hints
+
+from fastapi import Response
+from pydantic import BaseModel
+from pydantic_core import to_json
+
+
+class TrustedJSONResponse(Response):
+    media_type = 'application/json'
+
+
+@cache
+def _field_plan(model: type[BaseModel]) -> tuple:
+    # Para cada campo: nome, default e, se for list[Modelo], o plano do
+    # submodelo.
+    hints = get_type_hints(model)
+    plan = []
+    for name, field in model.model_fields.items():
+        nested = None
+        if get_origin(hints[name]) is list:
+            (item,) = get_args(hints[name])
+            if isinstance(item, type) and issubclass(item, BaseModel):
+                nested = _field_plan(item)
+        plan.append((name, field.default, nested))
+    return tuple(plan)
+
+
+def _dump(plan: tuple, obj) -> dict:
+    values = {}
+    for name, default, nested in plan:
+        if isinstance(obj, dict):
+            value = obj.get(name, default)
+        else:
+            value = getattr(obj, name)
+        if nested is not None:
+            value = [_dump(nested, item) for item in value]
+        values[name] = value
+    return values
+
+
+def encode_trusted(model: type[BaseModel], obj) -> bytes:
+    """Serializa `obj` (objeto ou dict) no formato de `model` sem validar.
+
+    Só serve para dados que já vieram do nosso banco: os valores são
+    lidos na ordem dos campos do modelo e codificados direto em bytes,
+    gerando o mesmo JSON que a validação do response_model geraria.
+    """
+    return to_json(_dump(_field_plan(model), obj))
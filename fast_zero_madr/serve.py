@@ -0,0 +1,126 @@
+"""Servidor de produção com vários workers.
+
+Uso: python -m fast_zero_madr.serve [--host 0.0.0.0] [--port 8000]
+
+O processo principal importa a aplicação uma única vez, abre o socket e
+faz fork dos workers, que compartilham o código já carregado. Cada worker
+atende até SERVER_MAX_REQUESTS (mais um jitter) requisições e sai; o
+processo principal repõe os que terminam e repassa SIGTERM/SIGINT.
+
+As invalidações de cache e o read-your-writes vivem em memória
+compartilhada criada na importação, antes do fork, e valem para todos os
+workers. As métricas de cada worker vão para um diretório temporário, de
+onde o /metrics de qualquer worker soma as de todos.
+"""
+
+import argparse
+import os
+import random
+import shutil
+import signal
+import socket
+import tempfile
+import time
+import traceback
+
+import uvicorn
+
+from fast_zero_madr.app import app
+from fast_zero_madr.database import reset_pools_after_fork
+from fast_zero_madr.metrics import metrics
+from fast_zero_madr.settings import Settings
+
+settings = Settings()
+
+
+def worker_count(configured: int) -> int:
+    if configured > 0:
+        return configured
+    return len(os.sched_getaffinity(0))
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(sock: socket.socket):
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    reset_pools_after_fork()
+
+    config = uvicorn.Config(
+        app,
+        limit_max_requests=settings.SERVER_MAX_REQUESTS
+        + random.randint(0, settings.SERVER_MAX_REQUESTS_JITTER),
+    )
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def spawn(sock: socket.socket) -> int:
+    pid = os.fork()
+    if pid == 0:
+        # Nada pode escapar do filho de volta para o laço do processo
+        # principal.
+        try:
+            run_worker(sock)
+        except BaseException:
+            traceback.print_exc()
+            os._exit(1)
+        os._exit(0)
+    return pid
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m fast_zero_madr.serve',
+        description='Servidor de produção com vários workers.',
+    )
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument(
+        '--workers', type=int, default=worker_count(settings.SERVER_WORKERS)
+    )
+    args = parser.parse_args(argv)
+
+    sock = bind_socket(args.host, args.port)
+    metrics.enable_multiprocess(
+        tempfile.mkdtemp(prefix='fast_zero_madr-metrics-')
+    )
+    workers = set()
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while True:
+        while not stopping and len(workers) < args.workers:
+            workers.add(spawn(sock))
+
+        if not workers:
+            break
+
+        pid, status = os.wait()
+        workers.discard(pid)
+        metrics.retire(pid)
+
+        # Um worker que falha ao subir não vira um laço de forks.
+        if not stopping and os.waitstatus_to_exitcode(status) != 0:
+            time.sleep(1)
+
+    sock.close()
+    shutil.rmtree(metrics.directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -10,3 +10,62 @@ class Settings(BaseSettings):
     SECRET_KEY: str
     ALGORITHM: str
     ACCESS_TOKEN_EXPIRE_MINUTES: int
+
+    # True: AsyncSession sobre o driver assíncrono do psycopg.
+    # False: Session síncrona com cada chamada ao banco no threadpool.
+    DATABASE_ASYNC: bool = True
+
+    DATABASE_POOL_SIZE: int = 5
+    DATABASE_MAX_OVERFLOW: int = 10
+    DATABASE_POOL_RECYCLE: int = -1
+    DATABASE_POOL_PRE_PING: bool = False
+    DATABASE_POOL_TIMEOUT: float = 30
+    # Conexões abertas por worker na subida (limitado a DATABASE_POOL_SIZE).
+    DATABASE_POOL_PREFILL: int = 2
+
+    # Réplica de leitura opcional. Quem escreveu há menos de
+    # DATABASE_READ_YOUR_WRITES segundos lê do primário; réplica fora do
+    # ar ou atrasada além de DATABASE_READ_MAX_LAG também.
+    DATABASE_READ_URL: str | None = None
+    DATABASE_READ_MAX_LAG: float = 5
+    DATABASE_READ_YOUR_WRITES: float = 5
+    # Slots da tabela (compartilhada entre os workers) de quem escreveu
+    # dentro da janela acima; colisões só mandam leituras ao primário.
+    DATABASE_READ_YOUR_WRITES_SIZE: int = 65536
+    DATABASE_READ_RETRY_AFTER: float = 30
+    DATABASE_READ_CHECK_INTERVAL: float = 1
+    DATABASE_READ_CONNECT_TIMEOUT: int = 2
+
+    PAGE_SIZE_DEFAULT: int = 100
+    PAGE_SIZE_MAX: int = 1000
+    # Livros embutidos por romancista em ?include=livros; o restante é
+    # paginado em /romancista/{id}/livros/.
+    INCLUDE_LIVROS_MAX: int = 10
+
+    USER_CACHE_SIZE: int = 1024
+    USER_CACHE_TTL: float = 60
+    TOKEN_CACHE_SIZE: int = 4096
+    QUERY_CACHE_SIZE: int = 1024
+    QUERY_CACHE_TTL: float = 30
+
+    ARGON2_TIME_COST: int = 3
+    ARGON2_MEMORY_COST: int = 65536
+    ARGON2_PARALLELISM: int = 4
+    HASH_WORKERS: int = 2
+
+    BULK_MAX_ITEMS: int = 50000
+    BULK_BATCH_SIZE: int = 1000
+
+    EXPORT_BATCH_SIZE: int = 1000
+
+    # 0: um worker por CPU disponível para o processo. As invalidações
+    # (gerações do cache de consultas, versões do cache de usuários e
+    # read-your-writes) ficam em memória herdada do fork e valem para
+    # todos os workers; instâncias separadas (outros containers) não as
+    # compartilham.
+    SERVER_WORKERS: int = 0
+    SERVER_MAX_REQUESTS: int = 10000
+    SERVER_MAX_REQUESTS_JITTER: int = 1000
+
+    # Com vários workers, cada um grava suas métricas a cada intervalo.
+    METRICS_FLUSH_INTERVAL: float = 1
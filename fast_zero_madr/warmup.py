@@ -0,0 +1,102 @@
+"""Aquecimento de cada worker antes de aceitar requisições.
+
+Abre as conexões do pool, compila uma vez cada formato de consulta quente
+(o cache de compilação do SQLAlchemy é por formato, não por valor),
+inicializa o Argon2 e o JWT e monta o schema OpenAPI.
+"""
+
+import asyncio
+import logging
+from contextlib import AsyncExitStack
+from itertools import product
+
+from fastapi import FastAPI
+from jwt import decode
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+
+from fast_zero_madr.database import REPLICA_LAG
+from fast_zero_madr.models import Livro, Romancista, User
+from fast_zero_madr.pagination import PageParams, encode_cursor, paginate
+from fast_zero_madr.routes.livro import LivroFilter, filter_livros
+from fast_zero_madr.routes.romancista import (
+    RomancistaFilter,
+    filter_romancistas,
+    livros_by_romancista,
+)
+from fast_zero_madr.security import create_access_token, hash_password
+from fast_zero_madr.settings import Settings
+
+settings = Settings()
+logger = logging.getLogger(__name__)
+
+
+async def prefill_pool(session_scope, size: int):
+    # Todas as sessões ficam abertas ao mesmo tempo, então cada uma
+    # segura uma conexão diferente; ao fechar, elas voltam ao pool.
+    async with AsyncExitStack() as stack:
+        sessions = [
+            await stack.enter_async_context(session_scope())
+            for _ in range(size)
+        ]
+        await asyncio.gather(
+            *(session.execute(select(1)) for session in sessions)
+        )
+
+
+def _pages(key) -> list[PageParams]:
+    return [
+        PageParams(limit=1, cursor=cursor, offset=None, with_count=None)
+        for cursor in (None, encode_cursor(key, 0))
+    ]
+
+
+async def prime_queries(session):
+    await session.scalar(select(User).where(User.email == 'warmup'))
+    await session.scalar(select(Livro).where(Livro.id == 0))
+    await session.scalar(select(Romancista).where(Romancista.id == 0))
+
+    for titulo, ano in product((None, 'a'), (None, 1)):
+        query = filter_livros(LivroFilter(titulo=titulo, ano=ano))
+        for page in _pages(Livro.id):
+            await paginate(session, query, Livro.id, page)
+
+    for nome in (None, 'a'):
+        query = filter_romancistas(RomancistaFilter(nome=nome, include=None))
+        for page in _pages(Romancista.id):
+            await paginate(session, query, Romancista.id, page)
+
+    await livros_by_romancista(session, [0], settings.INCLUDE_LIVROS_MAX)
+
+
+async def warm_database(session_scope, *statements):
+    size = min(settings.DATABASE_POOL_PREFILL, settings.DATABASE_POOL_SIZE)
+    # Banco fora do ar na subida não derruba o worker: ele sobe frio e o
+    # pool se recompõe na primeira requisição.
+    try:
+        if size:
+            await prefill_pool(session_scope, size)
+        async with session_scope() as session:
+            await prime_queries(session)
+            for statement in statements:
+                await session.execute(statement)
+    except SQLAlchemyError:
+        logger.warning('Aquecimento do banco falhou', exc_info=True)
+
+
+async def warm_up(app: FastAPI, session_scope, replica_scope=None):
+    # As leituras quentes e o get_current_user vão para a réplica quando
+    # ela existe, então o pool dela e o health check também esquentam.
+    databases = [warm_database(session_scope)]
+    if replica_scope is not None:
+        databases.append(warm_database(replica_scope, REPLICA_LAG))
+
+    # O hash roda no hash_executor enquanto as consultas vão ao banco.
+    await asyncio.gather(*databases, hash_password('warmup'))
+    decode(
+        create_access_token({'sub': 'warmup'}),
+        settings.SECRET_KEY,
+        algorithms=[settings.ALGORITHM],
+    )
+
+    app.openapi()
@@ -0,0 +1,41 @@
+"""trigram search indexes
+
+Revision ID: 3a7c9e1d5b24
+Revises: e2f2537fecff
+Create Date: 2024-09-02 19:12:41.308517
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3a7c9e1d5b24'
+down_revision: Union[str, None] = 'e2f2537fecff'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.execute('CREATE EXTENSION IF NOT EXISTS unaccent')
+    op.execute(
+        "CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text AS $$ "
+        "SELECT public.unaccent('public.unaccent', $1) $$ "
+        'LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT'
+    )
+    op.execute(
+        'CREATE INDEX ix_romancistas_nome_trgm ON romancistas '
+        'USING gin (f_unaccent(nome) gin_trgm_ops)'
+    )
+    op.execute(
+        'CREATE INDEX ix_livros_titulo_trgm ON livros '
+        'USING gin (f_unaccent(titulo) gin_trgm_ops)'
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_livros_titulo_trgm', table_name='livros')
+    op.drop_index('ix_romancistas_nome_trgm', table_name='romancistas')
+    op.execute('DROP FUNCTION IF EXISTS f_unaccent(text)')
@@ -0,0 +1,29 @@
+"""cascade livros on romancista delete
+
+Revision ID: 5e8f2a9c7d61
+Revises: 9d41b6f08c13
+Create Date: 2024-09-10 20:05:18.442193
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e8f2a9c7d61'
+down_revision: Union[str, None] = '9d41b6f08c13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(op.f('ix_livros_id_romancista'), 'livros', ['id_romancista'], unique=False)
+    op.drop_constraint('livros_id_romancista_fkey', 'livros', type_='foreignkey')
+    op.create_foreign_key('livros_id_romancista_fkey', 'livros', 'romancistas', ['id_romancista'], ['id'], ondelete='CASCADE')
+
+
+def downgrade() -> None:
+    op.drop_constraint('livros_id_romancista_fkey', 'livros', type_='foreignkey')
+    op.create_foreign_key('livros_id_romancista_fkey', 'livros', 'romancistas', ['id_romancista'], ['id'])
+    op.drop_index(op.f('ix_livros_id_romancista'), table_name='livros')
@@ -0,0 +1,43 @@
+"""full text search columns
+
+Revision ID: 9d41b6f08c13
+Revises: 3a7c9e1d5b24
+Create Date: 2024-09-04 21:37:05.114862
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d41b6f08c13'
+down_revision: Union[str, None] = '3a7c9e1d5b24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('romancistas', sa.Column(
+        'busca',
+        postgresql.TSVECTOR(),
+        sa.Computed("to_tsvector('portuguese', f_unaccent(nome))", persisted=True),
+        nullable=True,
+    ))
+    op.add_column('livros', sa.Column(
+        'busca',
+        postgresql.TSVECTOR(),
+        sa.Computed("to_tsvector('portuguese', f_unaccent(titulo))", persisted=True),
+        nullable=True,
+    ))
+    op.create_index('ix_romancistas_busca', 'romancistas', ['busca'], unique=False, postgresql_using='gin')
+    op.create_index('ix_livros_busca', 'livros', ['busca'], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_livros_busca', table_name='livros', postgresql_using='gin')
+    op.drop_index('ix_romancistas_busca', table_name='romancistas', postgresql_using='gin')
+    op.drop_column('livros', 'busca')
+    op.drop_column('romancistas', 'busca')
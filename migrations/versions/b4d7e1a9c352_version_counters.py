@@ -0,0 +1,28 @@
+"""version counters
+
+Revision ID: b4d7e1a9c352
+Revises: 5e8f2a9c7d61
+Create Date: 2024-09-12 19:48:33.907215
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b4d7e1a9c352'
+down_revision: Union[str, None] = '5e8f2a9c7d61'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('romancistas', sa.Column('versao', sa.Integer(), server_default='1', nullable=False))
+    op.add_column('livros', sa.Column('versao', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('livros', 'versao')
+    op.drop_column('romancistas', 'versao')
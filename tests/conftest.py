@@ -1,23 +1,55 @@
+from contextlib import asynccontextmanager
+
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool
 from testcontainers.postgres import PostgresContainer
 
 from fast_zero_madr.app import app
-from fast_zero_madr.database import get_session
+from fast_zero_madr.cache import query_cache
+from fast_zero_madr.database import get_session, get_session_scope
 from fast_zero_madr.models import table_registry
-from fast_zero_madr.security import get_password_hash
+from fast_zero_madr.security import (
+    get_password_hash,
+    token_cache,
+    user_cache,
+)
 from tests.factories import LivroFactory, RomancistaFactory, UserFactory
 
 
+@pytest.fixture(autouse=True)
+def _clear_caches():
+    user_cache.clear()
+    token_cache.clear()
+    query_cache.backend.clear()
+
+
 @pytest.fixture
-def client(session):
-    def get_session_override():
-        return session
+def anyio_backend():
+    return 'asyncio'
 
+
+@pytest.fixture
+def client(session, async_engine):
+    @asynccontextmanager
+    async def session_scope_override():
+        async with AsyncSession(
+            async_engine, expire_on_commit=False
+        ) as async_session:
+            yield async_session
+
+    async def get_session_override():
+        async with session_scope_override() as async_session:
+            yield async_session
+
+    app.dependency_overrides[get_session] = get_session_override
+    app.dependency_overrides[get_session_scope] = lambda: (
+        session_scope_override
+    )
     with TestClient(app) as client:
-        app.dependency_overrides[get_session] = get_session_override
         yield client
 
     app.dependency_overrides.clear()
@@ -32,6 +64,27 @@ def engine():
             yield _engine
 
 
+@pytest.fixture(scope='session')
+def async_engine(engine):
+    # Cada TestClient roda num event loop próprio; sem pool, nenhuma
+    # conexão assíncrona fica presa a um loop já encerrado.
+    _engine = create_async_engine(engine.url, poolclass=NullPool)
+    yield _engine
+    _engine.sync_engine.dispose()
+
+
+@pytest.fixture
+def statements(async_engine):
+    recorded = []
+
+    def record(conn, cursor, statement, *args):
+        recorded.append(statement)
+
+    event.listen(async_engine.sync_engine, 'before_cursor_execute', record)
+    yield recorded
+    event.remove(async_engine.sync_engine, 'before_cursor_execute', record)
+
+
 @pytest.fixture
 def session(engine):
     table_registry.metadata.create_all(engine)
@@ -43,6 +96,14 @@ def session(engine):
     table_registry.metadata.drop_all(engine)
 
 
+@pytest.fixture
+async def async_session(session, async_engine):
+    async with AsyncSession(
+        async_engine, expire_on_commit=False
+    ) as async_session:
+        yield async_session
+
+
 @pytest.fixture
 def user(session):
     password = 'testtest'
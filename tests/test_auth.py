@@ -1,6 +1,9 @@
 from http import HTTPStatus
 
 from freezegun import freeze_time
+from pwdlib.hashers.argon2 import Argon2Hasher
+
+from fast_zero_madr.security import hash_executor, verify_password
 
 
 def test_login_for_access_token_ok(client, user):
@@ -93,3 +96,20 @@ def test_refresh_access_token_expired(client, user):
 #         assert response.json() == {
 #             'detail': 'Não foi possível validar as credenciais'
 #         }
+
+
+def test_login_rehashes_outdated_password(session, client, user):
+    user.senha = Argon2Hasher(time_cost=1).hash(user.clean_password)
+    session.commit()
+    outdated_hash = user.senha
+
+    response = client.post(
+        '/auth/token/',
+        data={'username': user.email, 'password': user.clean_password},
+    )
+    session.refresh(user)
+
+    assert response.status_code == HTTPStatus.OK
+    assert user.senha != outdated_hash
+    assert verify_password(user.clean_password, user.senha)
+    assert hash_executor.stats()['queued'] == 0
@@ -0,0 +1,70 @@
+import json
+
+from sqlalchemy import select
+
+from fast_zero_madr.importer import import_livros, import_romancistas
+from fast_zero_madr.models import Livro, Romancista
+
+
+def test_import_romancistas_and_livros(session, engine, tmp_path):
+    romancistas = tmp_path / 'romancistas.csv'
+    romancistas.write_text(
+        'nome\nMachado de Assis\nMachado de Assis\n""\nClarice Lispector\n'
+    )
+    livros = tmp_path / 'livros.ndjson'
+    livros.write_text(
+        '\n'.join(
+            json.dumps(livro)
+            for livro in [
+                {
+                    'titulo': 'Dom Casmurro',
+                    'ano': 1899,
+                    'romancista': 'Machado de Assis',
+                },
+                {
+                    'titulo': 'Dom Casmurro',
+                    'ano': 1900,
+                    'romancista': 'Machado de Assis',
+                },
+                {
+                    'titulo': 'A Hora da Estrela',
+                    'ano': 1977,
+                    'romancista': 'Clarice Lispector',
+                },
+                {'titulo': 'Sem Autor', 'ano': 1950, 'romancista': 'Ninguém'},
+                {
+                    'titulo': 'Sem Ano',
+                    'ano': 'mil',
+                    'romancista': 'Machado de Assis',
+                },
+            ]
+        )
+    )
+
+    with engine.connect() as connection:
+        driver_connection = connection.connection.driver_connection
+        romancistas_report = import_romancistas(driver_connection, romancistas)
+        livros_report = import_livros(driver_connection, livros)
+
+    expected_read, expected_inserted = 4, 2
+    assert romancistas_report.read == expected_read
+    assert romancistas_report.inserted == expected_inserted
+    assert romancistas_report.rejected == {'sem nome': 1, 'duplicadas': 1}
+
+    expected_read, expected_inserted = 5, 2
+    assert livros_report.read == expected_read
+    assert livros_report.inserted == expected_inserted
+    assert livros_report.rejected == {
+        'ano inválido': 1,
+        'romancista desconhecido': 1,
+        'duplicadas': 1,
+    }
+    assert session.scalars(
+        select(Romancista.nome).order_by(Romancista.id)
+    ).all() == [
+        'Machado de Assis',
+        'Clarice Lispector',
+    ]
+    assert session.execute(
+        select(Livro.titulo, Livro.ano).order_by(Livro.id)
+    ).all() == [('Dom Casmurro', 1899), ('A Hora da Estrela', 1977)]
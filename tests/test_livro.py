@@ -1,5 +1,15 @@
+import json
 from http import HTTPStatus
 
+from fastapi import Depends
+
+from fast_zero_madr.app import app
+from fast_zero_madr.database import (
+    CACHE_SCOPE,
+    get_read_session,
+    get_session,
+)
+from fast_zero_madr.schemas import LivroPublicList
 from tests.factories import LivroFactory, RomancistaFactory
 
 
@@ -23,6 +33,26 @@ def test_create_livro_ok(client, romancista, token):
     }
 
 
+def test_create_livro_single_statement(client, romancista, statements, token):
+    client.post(
+        '/livro/',
+        headers={'Authorization': f'Bearer {token}'},
+        json={'titulo': 'um', 'id_romancista': romancista.id, 'ano': 2018},
+    )
+    statements.clear()
+
+    response = client.post(
+        '/livro/',
+        headers={'Authorization': f'Bearer {token}'},
+        json={'titulo': 'dois', 'id_romancista': romancista.id, 'ano': 2018},
+    )
+
+    assert response.status_code == HTTPStatus.CREATED
+    assert len(statements) == 1
+    assert statements[0].startswith('INSERT INTO livros')
+    assert 'busca' not in statements[0]
+
+
 def test_create_livro_already_exists(client, livro, token):
     response = client.post(
         '/livro/',
@@ -38,6 +68,66 @@ def test_create_livro_already_exists(client, livro, token):
     assert response.json() == {'detail': 'Romancista já cadastrado'}
 
 
+def test_create_livros_bulk_reports_conflicts(client, livro, token):
+    response = client.post(
+        '/livro/bulk',
+        headers={'Authorization': f'Bearer {token}'},
+        json=[
+            {'titulo': 'novo', 'ano': 2001, 'id_romancista': 1},
+            {'titulo': livro.titulo, 'ano': 2002, 'id_romancista': 1},
+            {'titulo': 'novo', 'ano': 2003, 'id_romancista': 1},
+            {'titulo': 'sem autor', 'ano': 2004, 'id_romancista': 99},
+            {'titulo': 'outro', 'ano': 2005, 'id_romancista': 1},
+        ],
+    )
+
+    assert response.status_code == HTTPStatus.CREATED
+    assert [livro['titulo'] for livro in response.json()['livros']] == [
+        'novo',
+        'outro',
+    ]
+    assert response.json()['conflicts'] == [
+        {'index': 1, 'detail': 'livro já consta no MADR'},
+        {'index': 2, 'detail': 'livro já consta no MADR'},
+        {'index': 3, 'detail': 'Romancista não consta no MADR'},
+    ]
+
+
+def test_export_livros_ndjson(client, livro, other_livro, token):
+    response = client.get(
+        '/livro/export',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers['content-type'] == 'application/x-ndjson'
+    assert [json.loads(line) for line in response.text.splitlines()] == [
+        {
+            'id': book.id,
+            'titulo': book.titulo,
+            'ano': book.ano,
+            'id_romancista': book.id_romancista,
+            'romancista': book.romancistas.nome,
+        }
+        for book in (livro, other_livro)
+    ]
+
+
+def test_export_livros_csv_gzip(client, livro, token):
+    response = client.get(
+        '/livro/export?formato=csv&gzip=true',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers['content-encoding'] == 'gzip'
+    assert response.text.splitlines() == [
+        'id,titulo,ano,id_romancista,romancista',
+        f'{livro.id},{livro.titulo},{livro.ano},{livro.id_romancista},'
+        f'{livro.romancistas.nome}',
+    ]
+
+
 def test_read_livro_ok(client, livro, token):
     response = client.get(
         f'/livro/{livro.id}/',
@@ -53,6 +143,40 @@ def test_read_livro_ok(client, livro, token):
     }
 
 
+def test_read_livro_etag_not_modified(client, livro, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    etag = client.get(f'/livro/{livro.id}/', headers=headers).headers['ETag']
+
+    response = client.get(
+        f'/livro/{livro.id}/', headers={**headers, 'If-None-Match': etag}
+    )
+
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+    assert response.headers['ETag'] == etag
+    assert not response.content
+
+
+def test_read_livro_etag_changes_on_update(client, livro, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    etag = client.get(f'/livro/{livro.id}/', headers=headers).headers['ETag']
+    client.put(
+        f'/livro/{livro.id}/',
+        headers=headers,
+        json={
+            'titulo': livro.titulo,
+            'ano': livro.ano,
+            'id_romancista': livro.id_romancista,
+        },
+    )
+
+    response = client.get(
+        f'/livro/{livro.id}/', headers={**headers, 'If-None-Match': etag}
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers['ETag'] != etag
+
+
 def test_read_livro_does_not_exist(client, token):
     response = client.get(
         '/livro/1/',
@@ -83,6 +207,28 @@ def test_read_filter_livro_titulo_ok(session, client, token):
     assert len(response.json()['livros']) == expected_todos
 
 
+def test_read_filter_livro_titulo_ignores_case_and_accents(
+    session, client, romancista, token
+):
+    session.add(
+        LivroFactory(titulo='Memórias Póstumas', id_romancista=romancista.id)
+    )
+    session.add(
+        LivroFactory(titulo='Dom Casmurro', id_romancista=romancista.id)
+    )
+    session.commit()
+
+    response = client.get(
+        '/livro/?titulo=MEMORIAS',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert [livro['titulo'] for livro in response.json()['livros']] == [
+        'Memórias Póstumas'
+    ]
+
+
 def test_read_filter_livro_ano_ok(session, client, token):
     expected_todos = 5
 
@@ -123,6 +269,240 @@ def test_read_filter_livro_titulo_ano_ok(session, client, token):
     assert len(response.json()['livros']) == expected_todos
 
 
+def test_read_filter_livro_cursor_pagination(session, client, token):
+    romancista = RomancistaFactory()
+    session.add(romancista)
+    session.commit()
+    session.bulk_save_objects(
+        LivroFactory.create_batch(5, id_romancista=romancista.id)
+    )
+    session.commit()
+
+    ids, cursor = [], None
+    while True:
+        params = {'limit': 2}
+        if cursor:
+            params['cursor'] = cursor
+        response = client.get(
+            '/livro/',
+            params=params,
+            headers={'Authorization': f'Bearer {token}'},
+        )
+        assert response.status_code == HTTPStatus.OK
+        ids.extend(livro['id'] for livro in response.json()['livros'])
+        cursor = response.json()['next_cursor']
+        if not cursor:
+            break
+
+    assert ids == [1, 2, 3, 4, 5]
+
+
+def test_read_filter_livro_weak_etag(client, livro, other_livro, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    etag = client.get('/livro/?limit=1', headers=headers).headers['ETag']
+
+    not_modified = client.get(
+        '/livro/?limit=1', headers={**headers, 'If-None-Match': etag}
+    )
+    other_page = client.get(
+        '/livro/?limit=2', headers={**headers, 'If-None-Match': etag}
+    )
+
+    assert etag.startswith('W/')
+    assert not_modified.status_code == HTTPStatus.NOT_MODIFIED
+    assert other_page.status_code == HTTPStatus.OK
+
+
+def test_read_filter_livro_etag_tracks_next_cursor(
+    client, livro, romancista, token
+):
+    headers = {'Authorization': f'Bearer {token}'}
+    etag = client.get('/livro/?limit=1', headers=headers).headers['ETag']
+    client.post(
+        '/livro/',
+        headers=headers,
+        json={'titulo': 'novo', 'ano': 2018, 'id_romancista': romancista.id},
+    )
+
+    response = client.get(
+        '/livro/?limit=1', headers={**headers, 'If-None-Match': etag}
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json()['next_cursor']
+
+
+def test_read_filter_livro_cached_until_write(
+    client, livro, statements, token
+):
+    headers = {'Authorization': f'Bearer {token}'}
+    first = client.get('/livro/?titulo=test', headers=headers)
+    statements.clear()
+
+    cached = client.get('/livro/?titulo=test', headers=headers)
+    cached_statements = list(statements)
+    client.post(
+        '/livro/',
+        headers=headers,
+        json={
+            'titulo': 'test novo',
+            'id_romancista': livro.id_romancista,
+            'ano': 2018,
+        },
+    )
+    refreshed = client.get('/livro/?titulo=test', headers=headers)
+
+    assert cached.json() == first.json()
+    assert cached_statements == []
+    assert [item['titulo'] for item in refreshed.json()['livros']] == [
+        livro.titulo,
+        'test novo',
+    ]
+
+
+def test_read_filter_livro_skips_cache_after_own_write(
+    client, livro, statements, token
+):
+    async def read_your_writes(session=Depends(get_session)):
+        session.info[CACHE_SCOPE] = None
+        yield session
+
+    app.dependency_overrides[get_read_session] = read_your_writes
+    headers = {'Authorization': f'Bearer {token}'}
+    client.get('/livro/', headers=headers)
+    statements.clear()
+
+    client.get('/livro/', headers=headers)
+
+    assert any('FROM livros' in statement for statement in statements)
+
+
+def test_read_filter_livro_replica_page_not_cached_after_write(
+    client, livro, statements, token
+):
+    async def replica_read(session=Depends(get_session)):
+        session.info[CACHE_SCOPE] = 'replica'
+        yield session
+
+    app.dependency_overrides[get_read_session] = replica_read
+    headers = {'Authorization': f'Bearer {token}'}
+    client.post(
+        '/livro/',
+        headers=headers,
+        json={
+            'titulo': 'novo',
+            'ano': 2018,
+            'id_romancista': livro.id_romancista,
+        },
+    )
+    client.get('/livro/', headers=headers)
+    statements.clear()
+
+    client.get('/livro/', headers=headers)
+
+    assert any('FROM livros' in statement for statement in statements)
+
+
+def test_read_filter_livro_body_matches_validated_response(
+    session, client, romancista, token
+):
+    session.add(
+        LivroFactory(titulo='Çé "aspas" \\ \n 🙂', id_romancista=romancista.id)
+    )
+    session.commit()
+
+    response = client.get(
+        '/livro/', headers={'Authorization': f'Bearer {token}'}
+    )
+
+    expected = LivroPublicList.model_validate(response.json()).model_dump()
+    assert (
+        response.content
+        == json.dumps(
+            expected, ensure_ascii=False, separators=(',', ':')
+        ).encode()
+    )
+
+
+def test_read_filter_livro_with_exact_count(
+    session, client, romancista, token
+):
+    session.add_all(LivroFactory.create_batch(3, id_romancista=romancista.id))
+    session.add(LivroFactory(titulo='outro', id_romancista=romancista.id))
+    session.commit()
+
+    response = client.get(
+        '/livro/?titulo=test&limit=1&with_count=exact',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.headers['X-Total-Count'] == '3'
+
+
+def test_read_filter_livro_with_estimated_count(client, livro, token):
+    headers = {'Authorization': f'Bearer {token}'}
+
+    unfiltered = client.get('/livro/?with_count=estimated', headers=headers)
+    filtered = client.get(
+        '/livro/?titulo=test&with_count=estimated', headers=headers
+    )
+
+    assert unfiltered.headers['X-Total-Count'].isdigit()
+    assert filtered.headers['X-Total-Count'].isdigit()
+
+
+def test_read_filter_livro_without_count(client, livro, token):
+    response = client.get(
+        '/livro/', headers={'Authorization': f'Bearer {token}'}
+    )
+
+    assert 'X-Total-Count' not in response.headers
+
+
+def test_read_filter_livro_invalid_cursor(client, token):
+    # 'eyJpZCI6dHJ1ZX0' é {"id":true}
+    for cursor in ('invalido', 'eyJpZCI6dHJ1ZX0'):
+        response = client.get(
+            f'/livro/?cursor={cursor}',
+            headers={'Authorization': f'Bearer {token}'},
+        )
+
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        assert response.json() == {'detail': 'Cursor inválido'}
+
+
+def test_read_filter_livro_limit_above_max(client, token):
+    response = client.get(
+        '/livro/?limit=1001',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
+def test_search_livros_ranked(session, client, romancista, token):
+    session.add_all([
+        LivroFactory(titulo='O Cortiço', id_romancista=romancista.id),
+        LivroFactory(
+            titulo='Cortiço, cortiços e outros cortiços',
+            id_romancista=romancista.id,
+        ),
+        LivroFactory(titulo='Dom Casmurro', id_romancista=romancista.id),
+    ])
+    session.commit()
+
+    response = client.get(
+        '/livro/search?q=cortico',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert [livro['titulo'] for livro in response.json()['livros']] == [
+        'Cortiço, cortiços e outros cortiços',
+        'O Cortiço',
+    ]
+
+
 def test_update_livro_ok(client, livro, token):
     response = client.put(
         f'/livro/{livro.id}/',
@@ -142,6 +522,26 @@ def test_update_livro_ok(client, livro, token):
     }
 
 
+def test_update_livro_same_titulo(client, livro, token):
+    response = client.put(
+        f'/livro/{livro.id}/',
+        headers={'Authorization': f'Bearer {token}'},
+        json={
+            'titulo': livro.titulo,
+            'ano': 1999,
+            'id_romancista': livro.id_romancista,
+        },
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json() == {
+        'id': livro.id,
+        'titulo': livro.titulo,
+        'ano': 1999,
+        'id_romancista': livro.id_romancista,
+    }
+
+
 def test_update_livro_other_livro(client, livro, other_livro, token):
     response = client.put(
         f'/livro/{livro.id}/',
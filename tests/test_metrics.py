@@ -0,0 +1,111 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from fast_zero_madr.metrics import (
+    Metrics,
+    metrics,
+    render,
+    track_queries,
+    untrack_queries,
+)
+
+
+@pytest.fixture
+def tracked(async_engine):
+    metrics.reset()
+    track_queries(async_engine.sync_engine)
+    yield
+    untrack_queries(async_engine.sync_engine)
+
+
+def test_metrics_per_route_template(tracked, client, livro, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    client.get(f'/livro/{livro.id}/', headers=headers)
+    client.get(f'/livro/{livro.id}/', headers=headers)
+    client.get('/nao-existe')
+
+    response = client.get('/metrics')
+
+    assert response.headers['content-type'].startswith('text/plain')
+    lines = response.text.splitlines()
+    labels = 'method="GET",route="/livro/{livro_id}/"'
+    assert f'http_requests_total{{{labels},status="200"}} 2.0' in lines
+    assert f'http_request_duration_seconds_count{{{labels}}} 2' in lines
+    assert f'http_response_size_bytes_count{{{labels}}} 2' in lines
+    assert (
+        'http_requests_total{method="GET",route="unmatched",status="404"} 1.0'
+        in lines
+    )
+    assert any(
+        line.startswith(f'http_request_db_queries_total{{{labels}}}')
+        for line in lines
+    )
+    assert 'http_requests_in_flight 1.0' in lines
+    assert any(
+        line.startswith('db_pool_size{engine="async"}') for line in lines
+    )
+
+
+def test_metrics_record_password_hashes(tracked, client, token):
+    response = client.get('/metrics')
+
+    assert (
+        'password_hash_duration_seconds_count{operation="verify_and_update"} 1'
+        in response.text.splitlines()
+    )
+
+
+def test_metrics_sum_workers_and_keep_retired_totals(tmp_path):
+    labels = (('method', 'GET'), ('route', '/livro/'))
+    retired, live = Metrics(), Metrics()
+    retired.enable_multiprocess(tmp_path)
+    live.directory = retired.directory
+
+    retired.in_flight = 1
+    retired.record_request(labels, 200, 0.01, 10, [1, 0.002])
+    retired.write_snapshot(pid=1)
+    retired.retire(1)
+    live.record_request(labels, 200, 0.3, 10, [2, 0.001])
+
+    lines = render(live.aggregate()).splitlines()
+
+    route = 'method="GET",route="/livro/"'
+    assert f'http_requests_total{{{route},status="200"}} 2.0' in lines
+    assert f'http_request_db_queries_total{{{route}}} 3.0' in lines
+    assert (
+        f'http_request_duration_seconds_bucket{{{route},le="0.01"}} 1' in lines
+    )
+    assert f'http_request_duration_seconds_count{{{route}}} 2' in lines
+    assert 'http_requests_in_flight 0.0' in lines
+
+
+def test_metrics_concurrent_snapshots(tmp_path):
+    live = Metrics()
+    live.enable_multiprocess(tmp_path)
+
+    with ThreadPoolExecutor(8) as executor:
+        list(executor.map(lambda _: live.write_snapshot(pid=1), range(200)))
+
+    assert [path.name for path in tmp_path.glob('1.*')] == ['1.json']
+
+
+@pytest.mark.anyio
+async def test_metrics_flusher_survives_os_error(tmp_path, monkeypatch):
+    live = Metrics()
+    live.enable_multiprocess(tmp_path)
+    writes = []
+
+    def write_snapshot():
+        writes.append(1)
+        raise OSError('disco cheio')
+
+    monkeypatch.setattr(live, 'write_snapshot', write_snapshot)
+    flusher = asyncio.create_task(live.flush_periodically(0))
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+    assert not flusher.done()
+    flusher.cancel()
+    assert len(writes) > 1
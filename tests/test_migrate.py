@@ -0,0 +1,68 @@
+import pytest
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+from sqlalchemy import text
+
+from fast_zero_madr.migrate import HEAD, LOCK_ID, migrate
+
+
+@pytest.fixture
+def alembic_version(engine):
+    def set_version(revision):
+        with engine.begin() as connection:
+            connection.execute(
+                text(
+                    'CREATE TABLE IF NOT EXISTS alembic_version '
+                    '(version_num varchar(32) PRIMARY KEY)'
+                )
+            )
+            connection.execute(text('DELETE FROM alembic_version'))
+            connection.execute(
+                text('INSERT INTO alembic_version VALUES (:revision)'),
+                {'revision': revision},
+            )
+
+    yield set_version
+
+    with engine.begin() as connection:
+        connection.execute(text('DROP TABLE IF EXISTS alembic_version'))
+
+
+def test_head_matches_migration_scripts():
+    script = ScriptDirectory.from_config(Config('alembic.ini'))
+
+    assert script.get_current_head() == HEAD
+
+
+def test_migrate_skips_when_at_head(engine, alembic_version):
+    alembic_version(HEAD)
+    calls = []
+
+    assert not migrate(engine, upgrade=lambda: calls.append(1))
+    assert calls == []
+
+
+def test_migrate_upgrades_under_lock(engine, alembic_version):
+    alembic_version('9d41b6f08c13')
+    locked = []
+
+    def upgrade():
+        with engine.connect() as other:
+            locked.append(
+                not other.scalar(
+                    text('SELECT pg_try_advisory_lock(:id)'), {'id': LOCK_ID}
+                )
+            )
+
+    assert migrate(engine, upgrade=upgrade)
+    assert locked == [True]
+
+    with engine.connect() as connection:
+        released = connection.scalar(
+            text('SELECT pg_try_advisory_lock(:id)'), {'id': LOCK_ID}
+        )
+        connection.execute(
+            text('SELECT pg_advisory_unlock(:id)'), {'id': LOCK_ID}
+        )
+
+    assert released
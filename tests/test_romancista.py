@@ -1,6 +1,10 @@
 from http import HTTPStatus
 
-from tests.factories import RomancistaFactory
+from sqlalchemy import select
+
+from fast_zero_madr.models import Livro
+from fast_zero_madr.routes.romancista import settings
+from tests.factories import LivroFactory, RomancistaFactory
 
 
 def test_create_romancista_ok(client, token):
@@ -32,6 +36,27 @@ def test_create_romancista_already_exists(client, romancista, token):
     assert response.json() == {'detail': 'Romancista já cadastrado'}
 
 
+def test_create_romancistas_bulk_reports_conflicts(client, romancista, token):
+    response = client.post(
+        '/romancista/bulk',
+        headers={'Authorization': f'Bearer {token}'},
+        json=[
+            {'nome': 'Clarice Lispector'},
+            {'nome': romancista.nome},
+            {'nome': 'Clarice Lispector'},
+        ],
+    )
+
+    assert response.status_code == HTTPStatus.CREATED
+    assert response.json() == {
+        'romancistas': [{'id': 2, 'nome': 'Clarice Lispector'}],
+        'conflicts': [
+            {'index': 1, 'detail': 'Romancista já cadastrado'},
+            {'index': 2, 'detail': 'Romancista já cadastrado'},
+        ],
+    }
+
+
 def test_read_romancista_ok(client, romancista, token):
     response = client.get(
         f'/romancista/{romancista.id}/',
@@ -42,6 +67,17 @@ def test_read_romancista_ok(client, romancista, token):
     assert response.json() == {'id': romancista.id, 'nome': romancista.nome}
 
 
+def test_read_romancista_etag_not_modified(client, romancista, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    url = f'/romancista/{romancista.id}/'
+    etag = client.get(url, headers=headers).headers['ETag']
+
+    response = client.get(url, headers={**headers, 'If-None-Match': etag})
+
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+    assert not response.content
+
+
 def test_read_romancista_does_not_exist(client, token):
     response = client.get(
         '/romancista/1/',
@@ -57,6 +93,7 @@ def test_read_filter_romancista(session, client, token):
     session.bulk_save_objects(
         RomancistaFactory.create_batch(expected_romancista)
     )
+    session.commit()
     response = client.get(
         '/romancista/?nome=test',
         headers={'Authorization': f'Bearer {token}'},
@@ -66,6 +103,181 @@ def test_read_filter_romancista(session, client, token):
     assert len(response.json()['romancistas']) == expected_romancista
 
 
+def test_read_filter_romancista_nome_escapes_wildcards(session, client, token):
+    session.add(RomancistaFactory(nome='José de Alencar'))
+    session.add(RomancistaFactory(nome='Jose_Saramago'))
+    session.commit()
+
+    response = client.get(
+        '/romancista/?nome=jose_',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert [r['nome'] for r in response.json()['romancistas']] == [
+        'Jose_Saramago'
+    ]
+
+
+def test_read_filter_romancista_next_cursor(session, client, token):
+    session.bulk_save_objects(RomancistaFactory.create_batch(3))
+    session.commit()
+
+    response = client.get(
+        '/romancista/?limit=2',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+    assert [r['id'] for r in response.json()['romancistas']] == [1, 2]
+
+    response = client.get(
+        '/romancista/',
+        params={'limit': 2, 'cursor': response.json()['next_cursor']},
+        headers={'Authorization': f'Bearer {token}'},
+    )
+    assert [r['id'] for r in response.json()['romancistas']] == [3]
+    assert response.json()['next_cursor'] is None
+
+
+def test_search_romancistas(session, client, token):
+    session.add_all([
+        RomancistaFactory(nome='Machado de Assis'),
+        RomancistaFactory(nome='Aluísio Azevedo'),
+    ])
+    session.commit()
+
+    response = client.get(
+        '/romancista/search?q=aluisio',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert [r['nome'] for r in response.json()['romancistas']] == [
+        'Aluísio Azevedo'
+    ]
+
+
+def test_search_romancistas_with_exact_count(session, client, token):
+    session.add_all([
+        RomancistaFactory(nome='Aluísio Azevedo'),
+        RomancistaFactory(nome='Artur Azevedo'),
+    ])
+    session.commit()
+
+    response = client.get(
+        '/romancista/search?q=azevedo&limit=1&with_count=exact',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert len(response.json()['romancistas']) == 1
+    assert response.headers['X-Total-Count'] == '2'
+
+
+def test_read_filter_romancista_include_livros(
+    session, client, statements, token
+):
+    expected_romancistas = 3
+    for _ in range(expected_romancistas):
+        db_romancista = RomancistaFactory()
+        session.add(db_romancista)
+        session.commit()
+        session.bulk_save_objects(
+            LivroFactory.create_batch(2, id_romancista=db_romancista.id)
+        )
+    session.commit()
+
+    statements.clear()
+    response = client.get(
+        '/romancista/?include=livros',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    # usuário autenticado + romancistas + livros de todos eles
+    expected_statements = 3
+    assert response.status_code == HTTPStatus.OK
+    assert len(statements) == expected_statements
+    assert [
+        [livro['id'] for livro in romancista['livros']]
+        for romancista in response.json()['romancistas']
+    ] == [[1, 2], [3, 4], [5, 6]]
+
+
+def test_read_filter_romancista_include_livros_capped(
+    session, client, romancista, token, monkeypatch
+):
+    monkeypatch.setattr(settings, 'INCLUDE_LIVROS_MAX', 2)
+    session.bulk_save_objects(
+        LivroFactory.create_batch(3, id_romancista=romancista.id)
+    )
+    session.commit()
+    headers = {'Authorization': f'Bearer {token}'}
+
+    response = client.get('/romancista/?include=livros', headers=headers)
+
+    (embedded,) = response.json()['romancistas']
+    assert [livro['id'] for livro in embedded['livros']] == [1, 2]
+
+    rest = client.get(embedded['livros_next'], headers=headers)
+
+    assert [livro['id'] for livro in rest.json()['livros']] == [3]
+
+
+def test_read_filter_romancista_etag_tracks_livros(client, livro, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    etag = client.get('/romancista/?include=livros', headers=headers).headers[
+        'ETag'
+    ]
+    client.put(
+        f'/livro/{livro.id}/',
+        headers=headers,
+        json={
+            'titulo': 'outro título',
+            'ano': livro.ano,
+            'id_romancista': livro.id_romancista,
+        },
+    )
+
+    response = client.get(
+        '/romancista/?include=livros',
+        headers={**headers, 'If-None-Match': etag},
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers['ETag'] != etag
+
+
+def test_read_filter_romancista_without_include(client, romancista, token):
+    response = client.get(
+        '/romancista/',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.json() == {
+        'romancistas': [{'id': romancista.id, 'nome': romancista.nome}],
+        'next_cursor': None,
+    }
+
+
+def test_read_romancista_livros(client, livro, other_livro, token):
+    response = client.get(
+        f'/romancista/{livro.id_romancista}/livros/?limit=1',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert [b['id'] for b in response.json()['livros']] == [livro.id]
+    assert response.json()['next_cursor']
+
+
+def test_read_romancista_livros_does_not_exist(client, token):
+    response = client.get(
+        '/romancista/1/livros/',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == HTTPStatus.NOT_FOUND
+    assert response.json() == {'detail': 'Romancista não consta no MADR'}
+
+
 def test_update_romancista_ok(client, romancista, token):
     response = client.put(
         f'/romancista/{romancista.id}/',
@@ -78,6 +290,22 @@ def test_update_romancista_ok(client, romancista, token):
     assert response.json() == {'nome': 'alice updated', 'id': romancista.id}
 
 
+def test_update_romancista_invalidates_cached_list(client, romancista, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    client.get('/romancista/', headers=headers)
+    client.put(
+        f'/romancista/{romancista.id}/',
+        headers=headers,
+        json={'nome': 'alice updated'},
+    )
+
+    response = client.get('/romancista/', headers=headers)
+
+    assert response.json()['romancistas'] == [
+        {'nome': 'alice updated', 'id': romancista.id}
+    ]
+
+
 def test_update_romancista_already_exists(
     client, romancista, other_romancista, token
 ):
@@ -114,6 +342,22 @@ def test_delete_romancista_ok(client, romancista, token):
     assert response.json() == {'nome': romancista.nome, 'id': romancista.id}
 
 
+def test_delete_romancista_cascades_livros(
+    session, client, livro, statements, token
+):
+    client.get('/romancista/', headers={'Authorization': f'Bearer {token}'})
+    statements.clear()
+
+    response = client.delete(
+        f'/romancista/{livro.id_romancista}/',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert len(statements) == 1
+    assert session.scalar(select(Livro.id)) is None
+
+
 def test_delete_romancista_does_not_exist(client, token):
     response = client.delete(
         '/romancista/1/',
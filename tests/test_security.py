@@ -2,12 +2,16 @@ from http import HTTPStatus
 
 import pytest
 from fastapi import HTTPException
-from jwt import decode
+from freezegun import freeze_time
+from jwt import ExpiredSignatureError, decode
 
 from fast_zero_madr.security import (
     create_access_token,
+    decode_access_token,
     get_current_user,
     settings,
+    token_cache,
+    user_cache,
 )
 
 
@@ -34,17 +38,51 @@ def test_jwt_invalid_token(client):
     }
 
 
-def test_get_current_not_user():
+@pytest.mark.anyio
+async def test_get_current_not_user():
     data = {}
     token = create_access_token(data)
 
     with pytest.raises(HTTPException):
-        get_current_user(token=token)
+        await get_current_user(token=token)
 
 
-def test_get_current_user_invalid(session):
+@pytest.mark.anyio
+async def test_get_current_user_invalid(async_session):
     data = {'sub': 'test@test.com'}
     token = create_access_token(data)
 
     with pytest.raises(HTTPException):
-        get_current_user(session=session, token=token)
+        await get_current_user(
+            session=async_session, read_session=async_session, token=token
+        )
+
+
+def test_get_current_user_cached(client, user, token):
+    headers = {'Authorization': f'Bearer {token}'}
+
+    client.post('/auth/refresh_token', headers=headers)
+    response = client.post('/auth/refresh_token', headers=headers)
+
+    assert response.status_code == HTTPStatus.OK
+    assert user_cache.stats() == {'size': 1, 'hits': 1, 'misses': 1}
+
+
+def test_decode_access_token_cached():
+    token = create_access_token({'sub': 'test@test.com'})
+
+    first = decode_access_token(token)
+    second = decode_access_token(token)
+
+    assert first == second
+    assert token_cache.stats()['hits'] == 1
+
+
+def test_decode_access_token_cached_expires_with_token():
+    with freeze_time('2023-07-14 12:00:00'):
+        token = create_access_token({'sub': 'test@test.com'})
+        decode_access_token(token)
+
+    with freeze_time('2023-07-14 13:31:00'):
+        with pytest.raises(ExpiredSignatureError):
+            decode_access_token(token)
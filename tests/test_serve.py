@@ -0,0 +1,36 @@
+import os
+
+from fast_zero_madr.cache import query_cache
+from fast_zero_madr.database import ReplicaRouter
+from fast_zero_madr.security import invalidate_user, user_versions
+from fast_zero_madr.serve import worker_count
+
+
+def test_worker_count_from_settings():
+    expected_workers = 3
+
+    assert worker_count(expected_workers) == expected_workers
+
+
+def test_worker_count_defaults_to_available_cpus():
+    assert worker_count(0) == len(os.sched_getaffinity(0))
+
+
+def test_invalidations_reach_other_workers(engine, async_engine):
+    replica = ReplicaRouter(async_engine, engine)
+    generation = query_cache.backend.generation('livros')
+    version = user_versions.get('a@a.com')
+
+    # O filho faz o papel do worker que atendeu a escrita.
+    pid = os.fork()
+    if pid == 0:
+        query_cache.invalidate('livros')
+        invalidate_user('a@a.com')
+        replica.record_write('Bearer a')
+        os._exit(0)
+    os.waitpid(pid, 0)
+
+    assert query_cache.backend.generation('livros') != generation
+    assert user_versions.get('a@a.com') != version
+    assert replica.recently_wrote('Bearer a')
+    assert not replica.recently_wrote('Bearer b')
@@ -92,3 +92,31 @@ def test_delete_user_other_user(client, other_user, token):
     )
     assert response.status_code == HTTPStatus.FORBIDDEN
     assert response.json() == {'detail': 'Não autorizado'}
+
+
+def test_delete_user_invalidates_cached_user(client, user, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    client.post('/auth/refresh_token', headers=headers)
+
+    client.delete(f'/user/{user.id}', headers=headers)
+    response = client.post('/auth/refresh_token', headers=headers)
+
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+
+
+def test_update_user_invalidates_cached_user(client, user, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    client.post('/auth/refresh_token', headers=headers)
+
+    client.put(
+        f'/user/{user.id}',
+        headers=headers,
+        json={
+            'username': 'alice',
+            'email': 'alice@example.com',
+            'senha': 'secret',
+        },
+    )
+    response = client.post('/auth/refresh_token', headers=headers)
+
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
@@ -0,0 +1,46 @@
+from contextlib import asynccontextmanager
+
+import pytest
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from fast_zero_madr.app import app
+from fast_zero_madr.warmup import warm_up
+
+
+def test_lifespan_primes_hot_queries(statements, client):
+    assert any('FROM livros' in statement for statement in statements)
+    assert any('FROM romancistas' in statement for statement in statements)
+    assert any('FROM users' in statement for statement in statements)
+
+
+@pytest.mark.anyio
+async def test_warm_up_survives_database_outage(caplog):
+    @asynccontextmanager
+    async def unavailable():
+        raise OperationalError('SELECT 1', {}, Exception('down'))
+        yield
+
+    await warm_up(app, unavailable)
+
+    assert 'Aquecimento do banco falhou' in caplog.text
+
+
+@pytest.mark.anyio
+async def test_warm_up_primes_replica(session, async_engine, statements):
+    @asynccontextmanager
+    async def unavailable():
+        raise OperationalError('SELECT 1', {}, Exception('down'))
+        yield
+
+    @asynccontextmanager
+    async def replica_scope():
+        async with AsyncSession(async_engine) as replica_session:
+            yield replica_session
+
+    await warm_up(app, unavailable, replica_scope)
+
+    assert any('FROM livros' in statement for statement in statements)
+    assert any(
+        'pg_last_wal_replay_lsn' in statement for statement in statements
+    )